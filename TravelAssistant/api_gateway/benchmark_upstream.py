@@ -0,0 +1,106 @@
+"""Benchmark the gateway's upstream hop: a fresh client per request vs. the pooled client.
+
+Starts a minimal upstream on a local port and replays the same proxied call with both
+strategies, reporting p50/p99 latency of the hop the gateway adds to every request.
+
+Usage:
+    python benchmark_upstream.py [requests] [concurrency]
+"""
+import asyncio
+import socket
+import statistics
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from upstream import Upstream
+
+PAYLOAD = b'[{"name": "Eiffel Tower", "location": "paris"}]'
+
+
+async def stub_upstream(scope, receive, send):
+    """Tiny ASGI app that answers every request with a fixed JSON body."""
+    if scope["type"] != "http":
+        return
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/json")],
+    })
+    await send({"type": "http.response.body", "body": PAYLOAD})
+
+
+def start_stub_server() -> str:
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+
+    config = uvicorn.Config(stub_upstream, host="127.0.0.1", port=port, log_level="warning")
+    server = uvicorn.Server(config)
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(label, call, total, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with semaphore:
+            start = time.perf_counter()
+            response = await call()
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{label:<22} p50={percentile(latencies, 50):7.2f} ms  "
+        f"p99={percentile(latencies, 99):7.2f} ms  "
+        f"mean={statistics.mean(latencies):7.2f} ms  "
+        f"throughput={total / elapsed:8.1f} req/s"
+    )
+
+
+async def main(total: int, concurrency: int):
+    base_url = start_stub_server()
+    print(f"Stub upstream on {base_url}: {total} requests, concurrency {concurrency}\n")
+
+    async def fresh_client_call():
+        # Previous gateway behaviour: a new client (and connection) for every request
+        async with httpx.AsyncClient() as client:
+            return await client.get(f"{base_url}/places", params={"location": "paris"})
+
+    pooled = Upstream("benchmark", base_url, timeout=10)
+    pooled.open()
+
+    async def pooled_call():
+        # Every call must reach the upstream, or this measures single-flight, not pooling
+        return await pooled.get("/places", params={"location": "paris"}, coalesce=False)
+
+    # Warm up both paths so the first connect is not counted
+    await run("warmup", pooled_call, concurrency, concurrency)
+    print()
+    await run("fresh client (before)", fresh_client_call, total, concurrency)
+    await run("pooled client (after)", pooled_call, total, concurrency)
+    await pooled.aclose()
+
+
+if __name__ == "__main__":
+    total_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    asyncio.run(main(total_requests, concurrency))
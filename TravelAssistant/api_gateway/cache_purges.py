@@ -0,0 +1,84 @@
+"""Response-cache purges shared by all gateway workers.
+
+Every worker process keeps its own response cache, so ``DELETE /admin/cache`` on one
+worker cannot clear the others directly. Instead a purge bumps a generation counter
+for its scope (``*`` for everything, otherwise an upstream name) in a SQLite file all
+workers share (``CACHE_PURGE_DB``, by default the refresh-token database). Each worker
+reads the counters every ``CACHE_PURGE_POLL_INTERVAL`` seconds and drops the matching
+entries of its own cache when one has moved, so a purge reaches every worker within
+that interval. Queries run on a single worker thread, off the event loop.
+"""
+import asyncio
+import os
+import sqlite3
+from typing import Callable, Dict, Optional
+
+from refresh_tokens import REFRESH_TOKEN_DB
+from sqlite_worker import SqliteWorker
+
+CACHE_PURGE_DB = os.getenv("CACHE_PURGE_DB", REFRESH_TOKEN_DB)
+CACHE_PURGE_POLL_INTERVAL = float(os.getenv("CACHE_PURGE_POLL_INTERVAL", "1"))
+ALL = "*"
+SCHEMA = ("CREATE TABLE IF NOT EXISTS cache_purges (scope TEXT PRIMARY KEY, generation INTEGER NOT NULL)",)
+
+
+class CachePurges:
+    def __init__(self, db_path: str = CACHE_PURGE_DB, interval: float = CACHE_PURGE_POLL_INTERVAL):
+        self.db = SqliteWorker(db_path, SCHEMA, "cache-purges")
+        self.interval = interval
+        # Generation of every scope this worker's cache is already consistent with
+        self._seen: Dict[str, int] = {}
+        self._task: Optional[asyncio.Future] = None
+        self.published = 0
+        self.applied = 0
+
+    async def start(self, purge: Callable[[Optional[str]], int]) -> None:
+        """Start following other workers' purges, calling ``purge(upstream)`` for each.
+
+        Purges published before this worker started are already reflected in its
+        (empty) cache, so the current generations are taken as the baseline.
+        """
+        self._seen = await self.db.run(self._generations)
+        self._task = asyncio.ensure_future(self._poll_loop(purge))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def publish(self, upstream: Optional[str]) -> None:
+        """Ask every worker to purge ``upstream`` (all upstreams when None)."""
+        scope = ALL if upstream is None else upstream
+        # The caller has already purged this worker's cache
+        self._seen[scope] = await self.db.run(self._bump, scope)
+        self.published += 1
+
+    @staticmethod
+    def _bump(db: sqlite3.Connection, scope: str) -> int:
+        db.execute(
+            "INSERT INTO cache_purges (scope, generation) VALUES (?, 1)"
+            " ON CONFLICT(scope) DO UPDATE SET generation = generation + 1",
+            (scope,),
+        )
+        return db.execute("SELECT generation FROM cache_purges WHERE scope = ?", (scope,)).fetchone()[0]
+
+    @staticmethod
+    def _generations(db: sqlite3.Connection) -> Dict[str, int]:
+        return dict(db.execute("SELECT scope, generation FROM cache_purges").fetchall())
+
+    async def _poll_loop(self, purge: Callable[[Optional[str]], int]) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                generations = await self.db.run(self._generations)
+            except sqlite3.Error as e:
+                print(f"Error reading cache purges: {str(e)}")
+                continue
+            for scope, generation in generations.items():
+                if self._seen.get(scope) != generation:
+                    self._seen[scope] = generation
+                    purge(None if scope == ALL else scope)
+                    self.applied += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"published": self.published, "applied": self.applied}
@@ -0,0 +1,348 @@
+"""Prometheus instrumentation shared by the Travel Assistant services.
+
+Each service is built from its own directory, so this module is kept as an identical
+copy in every service folder. ``install(app, "<service>")`` adds:
+
+- a per-route request latency histogram and an in-flight requests gauge,
+- an event-loop lag gauge sampled in the background,
+- ``GET /metrics`` in the Prometheus text format.
+
+Calls to downstream dependencies (another service, MongoDB, Google APIs) are timed
+with ``track_dependency``.
+
+When ``PROMETHEUS_MULTIPROC_DIR`` is set (``serve.py`` does so for several workers),
+``/metrics`` aggregates the samples every worker process writes to that directory.
+
+Tracing is off unless ``TRACE_EXPORTER`` is set. Every request then gets a server span
+that continues the caller's W3C ``traceparent`` (or the span active in this process),
+every ``track_dependency`` call gets a client span, and ``inject_traceparent`` (an httpx
+request hook) propagates the context to the next service. Finished spans are appended
+to ``TRACE_FILE`` as JSON lines (``file``) or kept in ``finished_spans`` (``memory``).
+"""
+import asyncio
+import json
+import os
+import random
+import secrets
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from starlette.requests import Request
+from starlette.responses import Response
+
+EVENT_LOOP_LAG_INTERVAL = 0.5
+PROMETHEUS_MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Tracing: "" (off), "file" or "memory"
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "").lower()
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+TRACE_BUFFER_SIZE = int(os.getenv("TRACE_BUFFER_SIZE", "10000"))
+TRACE_FLUSH_INTERVAL = 1.0
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling HTTP requests",
+    ["service", "method", "route", "status"],
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "HTTP requests currently being handled",
+    ["service"],
+    multiprocess_mode="livesum",
+)
+DEPENDENCY_LATENCY = Histogram(
+    "dependency_request_duration_seconds",
+    "Time spent waiting on downstream dependencies",
+    ["service", "dependency", "operation"],
+)
+DEPENDENCY_ERRORS = Counter(
+    "dependency_errors_total",
+    "Calls to downstream dependencies that raised an error",
+    ["service", "dependency", "operation"],
+)
+EVENT_LOOP_LAG = Gauge(
+    "event_loop_lag_seconds",
+    "Delay between when a timer should fire and when the event loop runs it",
+    ["service"],
+    multiprocess_mode="livemax",
+)
+
+# Label children are resolved once per label set instead of on every request
+_latency_children: Dict[Tuple[str, ...], object] = {}
+# Most recent event-loop lag sample per service, for admission control
+_event_loop_lag: Dict[str, float] = {}
+
+# Span of the request or dependency call the current task is working on
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+# Memory exporter: most recent finished spans, oldest dropped first
+finished_spans: Deque[Dict[str, Any]] = deque(maxlen=TRACE_BUFFER_SIZE)
+# File exporter: encoded spans waiting for the next flush
+_unflushed_spans: List[str] = []
+
+
+class Span:
+    __slots__ = (
+        "trace_id", "span_id", "parent_id", "sampled", "service", "name", "kind",
+        "attributes", "error", "start", "_started",
+    )
+
+    def __init__(self, service: str, name: str, kind: str, trace_id: str, parent_id: Optional[str], sampled: bool):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.service = service
+        self.name = name
+        self.kind = kind
+        self.attributes: Dict[str, Any] = {}
+        self.error: Optional[str] = None
+        self.start = time.time()
+        self._started = time.perf_counter()
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def finish(self) -> None:
+        if not self.sampled:
+            return
+        _export({
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "service": self.service,
+            "name": self.name,
+            "kind": self.kind,
+            "start": self.start,
+            "duration_ms": round((time.perf_counter() - self._started) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        })
+
+
+def parse_traceparent(value: str) -> Optional[Tuple[str, str, bool]]:
+    """Return (trace id, parent span id, sampled) of a W3C ``traceparent``, or None if invalid."""
+    parts = value.strip().lower().split("-")
+    if len(parts) < 4 or parts[0] == "ff":
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    if len(version) != 2 or len(trace_id) != 32 or len(parent_id) != 16 or len(flags) != 2:
+        return None
+    try:
+        int(trace_id, 16), int(parent_id, 16)
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    if trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, sampled
+
+
+@contextmanager
+def start_span(service: str, name: str, kind: str = "internal", traceparent: Optional[str] = None):
+    """Run the block in a new span; yields None when tracing is off.
+
+    The parent is the remote ``traceparent`` if one is given and valid, otherwise the
+    span active in this task; without either a new (sampled or not) trace starts.
+    """
+    if not TRACE_EXPORTER:
+        yield None
+        return
+    remote = parse_traceparent(traceparent) if traceparent else None
+    parent = _current_span.get()
+    if remote is not None:
+        trace_id, parent_id, sampled = remote
+    elif parent is not None:
+        trace_id, parent_id, sampled = parent.trace_id, parent.span_id, parent.sampled
+    else:
+        trace_id, parent_id, sampled = secrets.token_hex(16), None, random.random() < TRACE_SAMPLE_RATE
+    span = Span(service, name, kind, trace_id, parent_id, sampled)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as exc:
+        span.error = f"{type(exc).__name__}: {exc}"
+        raise
+    finally:
+        _current_span.reset(token)
+        span.finish()
+
+
+def current_traceparent() -> Optional[str]:
+    span = _current_span.get()
+    return span.traceparent if span is not None else None
+
+
+async def inject_traceparent(request) -> None:
+    """httpx request event hook adding the active span's ``traceparent`` header."""
+    traceparent = current_traceparent()
+    if traceparent is not None:
+        request.headers["traceparent"] = traceparent
+
+
+def _export(record: Dict[str, Any]) -> None:
+    if TRACE_EXPORTER == "memory":
+        finished_spans.append(record)
+    elif TRACE_EXPORTER == "file":
+        _unflushed_spans.append(json.dumps(record, separators=(",", ":")))
+        if len(_unflushed_spans) >= TRACE_BUFFER_SIZE:
+            flush_spans()
+
+
+def flush_spans() -> None:
+    """Append the buffered spans to ``TRACE_FILE`` in one write."""
+    if not _unflushed_spans:
+        return
+    # Spans may finish on worker threads meanwhile; only drop the ones written here
+    spans = _unflushed_spans[:]
+    del _unflushed_spans[:len(spans)]
+    lines = "\n".join(spans) + "\n"
+    with open(TRACE_FILE, "a", encoding="utf-8") as trace_file:
+        trace_file.write(lines)
+
+
+async def flush_spans_periodically(interval: float = TRACE_FLUSH_INTERVAL) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        flush_spans()
+
+
+def _observe_request(service: str, method: str, route: str, status: int, elapsed: float) -> None:
+    key = (service, method, route, str(status))
+    child = _latency_children.get(key)
+    if child is None:
+        child = _latency_children[key] = REQUEST_LATENCY.labels(*key)
+    child.observe(elapsed)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording latency per route template and in-flight requests.
+
+    When tracing is on it also runs the request in a server span.
+    """
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.service = service
+        self.in_flight = REQUESTS_IN_FLIGHT.labels(service)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        if TRACE_EXPORTER:
+            traceparent = None
+            for name, value in scope["headers"]:
+                if name == b"traceparent":
+                    traceparent = value.decode("latin-1")
+                    break
+            with start_span(self.service, scope["method"], "server", traceparent) as span:
+                span.attributes["http.target"] = scope["path"]
+                await self._handle(scope, receive, send_wrapper, lambda: status_code, span)
+        else:
+            await self._handle(scope, receive, send_wrapper, lambda: status_code, None)
+
+    async def _handle(self, scope, receive, send, get_status, span: Optional[Span]):
+        self.in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.in_flight.dec()
+            # The router stores the matched route in the scope; label by its template
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            status_code = get_status()
+            _observe_request(self.service, scope["method"], route_path, status_code, elapsed)
+            if span is not None:
+                span.name = f"{scope['method']} {route_path}"
+                span.attributes["http.status_code"] = status_code
+
+
+@contextmanager
+def track_dependency(service: str, dependency: str, operation: str):
+    """Time a call to a downstream dependency, counting it as an error if it raises.
+
+    The call also gets a client span when tracing is on; it is yielded (None when off)
+    so the caller can add attributes.
+    """
+    start = time.perf_counter()
+    try:
+        with start_span(service, f"{dependency} {operation}", "client") as span:
+            yield span
+    except Exception:
+        DEPENDENCY_ERRORS.labels(service, dependency, operation).inc()
+        raise
+    finally:
+        DEPENDENCY_LATENCY.labels(service, dependency, operation).observe(time.perf_counter() - start)
+
+
+async def monitor_event_loop_lag(service: str, interval: float = EVENT_LOOP_LAG_INTERVAL) -> None:
+    gauge = EVENT_LOOP_LAG.labels(service)
+    loop = asyncio.get_running_loop()
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        lag = max(0.0, loop.time() - start - interval)
+        _event_loop_lag[service] = lag
+        gauge.set(lag)
+
+
+def get_event_loop_lag(service: str) -> float:
+    """Latest sampled event-loop lag of ``service`` in seconds (0 before the first sample)."""
+    return _event_loop_lag.get(service, 0.0)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    if PROMETHEUS_MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry, PROMETHEUS_MULTIPROC_DIR)
+        return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+def install(app, service: str) -> None:
+    """Add the metrics middleware, the /metrics route, the event-loop lag monitor and,
+    with the file exporter, the periodic span flush."""
+    app.add_middleware(MetricsMiddleware, service=service)
+    app.add_route("/metrics", metrics_endpoint, methods=["GET"], include_in_schema=False)
+
+    original_lifespan = app.router.lifespan_context
+
+    @asynccontextmanager
+    async def lifespan_with_monitor(app):
+        tasks = [asyncio.ensure_future(monitor_event_loop_lag(service))]
+        if TRACE_EXPORTER == "file":
+            tasks.append(asyncio.ensure_future(flush_spans_periodically()))
+        try:
+            async with original_lifespan(app) as state:
+                yield state
+        finally:
+            for task in tasks:
+                task.cancel()
+            flush_spans()
+
+    app.router.lifespan_context = lifespan_with_monitor
@@ -1,27 +1,199 @@
-from fastapi import FastAPI, Depends, HTTPException, status, Query
+from fastapi import FastAPI, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.routing import Match
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import hashlib
 import httpx
+import math
 import os
-from typing import Optional
+import sqlite3
+import time
+from typing import Annotated, Any, Awaitable, Dict, List, Optional
+
+import fastjson
+import instrumentation
+import wire
+from cache import LRUCache
+from cache_purges import CachePurges
+from refresh_tokens import RefreshTokenStore
+from ratelimit import (
+    AdmissionControl,
+    AdmissionControlMiddleware,
+    BodySizeLimitMiddleware,
+    InternalRequests,
+    RateLimiter,
+    parse_rate,
+)
+from upstream import Upstream, UpstreamUnavailable
 
 # Configuration
 SECRET_KEY = "CHANGE_THIS_TO_A_SECURE_SECRET_KEY"  # In production, use a secure key and store it safely
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "30"))
+# Number of already-verified bearer tokens kept in memory (0 disables the cache)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+# bcrypt verifications run on a dedicated pool so logins never block the event loop
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+# Logins allowed to wait for a free worker before /token answers 503
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+# Users allowed to call the /admin endpoints (none unless configured)
+ADMIN_USERNAMES = set(filter(None, os.getenv("ADMIN_USERNAMES", "").split(",")))
 
 # Service URLs from environment variables
 TRANSLATION_SERVICE_URL = os.getenv("TRANSLATION_SERVICE_URL", "http://localhost:8001")
 MAP_SERVICE_URL = os.getenv("MAP_SERVICE_URL", "http://localhost:8002")
 PACKING_SERVICE_URL = os.getenv("PACKING_SERVICE_URL", "http://localhost:8003")
 
+# Optional comma-separated replica lists; they take precedence over the single URLs above
+def service_urls(name: str, default: str):
+    urls = [url.strip() for url in os.getenv(name, "").split(",") if url.strip()]
+    return urls or [default]
+
+TRANSLATION_SERVICE_URLS = service_urls("TRANSLATION_SERVICE_URLS", TRANSLATION_SERVICE_URL)
+MAP_SERVICE_URLS = service_urls("MAP_SERVICE_URLS", MAP_SERVICE_URL)
+PACKING_SERVICE_URLS = service_urls("PACKING_SERVICE_URLS", PACKING_SERVICE_URL)
+
+# Per-upstream timeout budgets in seconds (translation waits on Google APIs)
+TRANSLATION_SERVICE_TIMEOUT = float(os.getenv("TRANSLATION_SERVICE_TIMEOUT", "30"))
+MAP_SERVICE_TIMEOUT = float(os.getenv("MAP_SERVICE_TIMEOUT", "10"))
+PACKING_SERVICE_TIMEOUT = float(os.getenv("PACKING_SERVICE_TIMEOUT", "10"))
+
+# Wire format requested from the services: "json" or "msgpack" (binary, no base64 audio).
+# Clients always get JSON; MessagePack answers are re-encoded at the gateway.
+INTERNAL_TRANSPORT = os.getenv("INTERNAL_TRANSPORT", "json").lower()
+UPSTREAM_HEADERS = (
+    {"Accept": wire.ACCEPT_MSGPACK}
+    if INTERNAL_TRANSPORT == "msgpack" and wire.msgpack is not None
+    else None
+)
+
+# Per-user token buckets per route, as "<requests per second>/<burst>"
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+RATE_LIMIT_DEFAULT = parse_rate(os.getenv("RATE_LIMIT_DEFAULT", "20/40"))
+RATE_LIMITS = {
+    "/translate/text": parse_rate(os.getenv("RATE_LIMIT_TRANSLATE_TEXT", "5/20")),
+    "/translate/tts": parse_rate(os.getenv("RATE_LIMIT_TRANSLATE_TTS", "2/10")),
+    "/translate/batch": parse_rate(os.getenv("RATE_LIMIT_TRANSLATE_BATCH", "1/5")),
+    "/batch": parse_rate(os.getenv("RATE_LIMIT_BATCH", "2/5")),
+}
+RATE_LIMIT_MAX_BUCKETS = int(os.getenv("RATE_LIMIT_MAX_BUCKETS", "100000"))
+# Global load shedding thresholds (0 disables a check)
+GATEWAY_MAX_IN_FLIGHT = int(os.getenv("GATEWAY_MAX_IN_FLIGHT", "512"))
+GATEWAY_MAX_EVENT_LOOP_LAG = float(os.getenv("GATEWAY_MAX_EVENT_LOOP_LAG", "0.25"))
+
+# Request validation limits enforced before anything is forwarded upstream
+GATEWAY_MAX_BODY_BYTES = int(os.getenv("GATEWAY_MAX_BODY_BYTES", str(64 * 1024)))
+MAX_TEXT_LENGTH = int(os.getenv("MAX_TEXT_LENGTH", "5000"))
+MAX_ACTIVITIES = 20
+TRANSLATE_BATCH_MAX_TEXTS = int(os.getenv("TRANSLATE_BATCH_MAX_TEXTS", "100"))
+TRANSLATE_BATCH_MAX_TARGETS = int(os.getenv("TRANSLATE_BATCH_MAX_TARGETS", "10"))
+
+# Limits for POST /batch
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "50"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+# Only these proxied routes (method, route template) may be multiplexed through /batch
+BATCH_ALLOWED_ROUTES = {
+    ("POST", "/translate/text"),
+    ("POST", "/translate/batch"),
+    ("POST", "/translate/tts"),
+    ("GET", "/translate/languages"),
+    ("GET", "/translate/voices/{language_code}"),
+    ("GET", "/translate/common-phrases"),
+    ("GET", "/translate/common-phrases/categories"),
+    ("GET", "/translate/common-phrases/by-category/{category}"),
+    ("GET", "/translate/common-phrases/{phrase_id}"),
+    ("GET", "/map/places"),
+    ("GET", "/map/directions"),
+    ("POST", "/packing/generate"),
+    ("POST", "/trip/bundle"),
+}
+
+# Gateway-side cache for idempotent GET routes whose data only changes on reseed
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", "1024"))
+RESPONSE_CACHE_TTLS = {
+    "languages": float(os.getenv("CACHE_TTL_LANGUAGES", "3600")),
+    "voices": float(os.getenv("CACHE_TTL_VOICES", "3600")),
+    "phrase_categories": float(os.getenv("CACHE_TTL_PHRASE_CATEGORIES", "600")),
+    "phrases_by_category": float(os.getenv("CACHE_TTL_PHRASES_BY_CATEGORY", "600")),
+    "places": float(os.getenv("CACHE_TTL_PLACES", "300")),
+}
+
+# One pooled client per upstream service, opened in the application lifespan
+translation_upstream = Upstream(
+    "translation", TRANSLATION_SERVICE_URLS, TRANSLATION_SERVICE_TIMEOUT, headers=UPSTREAM_HEADERS
+)
+map_upstream = Upstream("map", MAP_SERVICE_URLS, MAP_SERVICE_TIMEOUT, headers=UPSTREAM_HEADERS)
+packing_upstream = Upstream("packing", PACKING_SERVICE_URLS, PACKING_SERVICE_TIMEOUT, headers=UPSTREAM_HEADERS)
+UPSTREAMS = [translation_upstream, map_upstream, packing_upstream]
+
 # Models
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
+class CachedResponse(BaseModel):
+    status_code: int
+    body: bytes
+    media_type: Optional[str] = None
+    etag: str
+
+# Request schemas of the translation and packing services, validated at the edge
+class TranslationRequest(BaseModel):
+    text: str = Field(min_length=1, max_length=MAX_TEXT_LENGTH)
+    source_language: str = Field(max_length=16)
+    target_language: str = Field(max_length=16)
+
+class BatchTranslationRequest(BaseModel):
+    texts: List[Annotated[str, Field(max_length=MAX_TEXT_LENGTH)]] = Field(min_length=1, max_length=TRANSLATE_BATCH_MAX_TEXTS)
+    source_language: str = Field(max_length=16)
+    target_languages: List[Annotated[str, Field(max_length=16)]] = Field(min_length=1, max_length=TRANSLATE_BATCH_MAX_TARGETS)
+
+class TTSRequest(BaseModel):
+    text: str = Field(min_length=1, max_length=MAX_TEXT_LENGTH)
+    language_code: str = Field(max_length=16)
+    voice_name: Optional[str] = Field(None, max_length=64)
+    speaking_rate: Optional[float] = Field(1.0, ge=0.25, le=4.0)
+    pitch: Optional[float] = Field(0.0, ge=-20.0, le=20.0)
+
+class PackingListRequest(BaseModel):
+    destination: str = Field(min_length=1, max_length=100)
+    duration: int = Field(ge=1, le=365)  # in days
+    season: str = Field(max_length=50)
+    trip_type: str = Field("leisure", max_length=50)
+    activities: List[str] = Field([], max_length=MAX_ACTIVITIES)
+    gender: Optional[str] = Field(None, max_length=20)
+    age_group: Optional[str] = Field(None, max_length=20)
+
+class TripBundleRequest(BaseModel):
+    destination: str = Field(min_length=1, max_length=100)
+    duration: int = Field(ge=1, le=365)  # in days
+    season: str = Field(max_length=50)
+    language: Optional[str] = Field(None, max_length=16)  # e.g. "ja" or "ja-JP"; limits phrase translations to it
+    trip_type: str = Field("leisure", max_length=50)
+    activities: List[str] = Field([], max_length=MAX_ACTIVITIES)
+    phrase_limit: int = Field(50, ge=1, le=100)
+
+class BatchSubRequest(BaseModel):
+    method: str = "GET"
+    path: str  # gateway route, e.g. "/translate/common-phrases/{phrase_id}"
+    params: Dict[str, Any] = {}
+    body: Optional[Any] = None
+
+class BatchRequest(BaseModel):
+    requests: List[BatchSubRequest]
 
 class TokenData(BaseModel):
     username: Optional[str] = None
@@ -50,21 +222,84 @@ fake_users_db = {
     }
 }
 
+# Verified tokens -> UserInDB, each entry expiring at the token's own "exp" claim
+token_cache = LRUCache(maxsize=TOKEN_CACHE_SIZE)
+# Current refresh token of every login session, shared by all worker processes
+refresh_token_store = RefreshTokenStore()
+
+# (upstream, path, params) -> CachedResponse for the cacheable GET routes
+response_cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE)
+# Carries DELETE /admin/cache to the response caches of the other worker processes
+cache_purges = CachePurges()
+
+# Per-user/per-route rate limits and global admission control
+rate_limiter = RateLimiter(RATE_LIMIT_DEFAULT, RATE_LIMITS, RATE_LIMIT_MAX_BUCKETS)
+admission_control = AdmissionControl(
+    max_in_flight=GATEWAY_MAX_IN_FLIGHT,
+    max_event_loop_lag=GATEWAY_MAX_EVENT_LOOP_LAG,
+    event_loop_lag=lambda: instrumentation.get_event_loop_lag("api_gateway"),
+)
+# /batch sub-requests re-enter the app; they are recognised by a per-process secret header
+internal_requests = InternalRequests()
+
+# Worker pool and counters for password verification
+password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+password_hash_stats = {"pending": 0, "max_pending": 0, "completed": 0, "rejected": 0}
+
+def _reset_password_pool_after_fork():
+    # Worker threads do not survive fork; give a forked process its own pool
+    global password_executor
+    password_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+    password_hash_stats.update(pending=0, max_pending=0, completed=0, rejected=0)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_password_pool_after_fork)
+
 # Auth functions
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+async def verify_password_async(plain_password, hashed_password):
+    """Run the bcrypt check on the password pool, shedding logins once the queue is full."""
+    if password_hash_stats["pending"] >= PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE:
+        password_hash_stats["rejected"] += 1
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many concurrent logins, please retry",
+            headers={"Retry-After": "1"},
+        )
+    password_hash_stats["pending"] += 1
+    password_hash_stats["max_pending"] = max(password_hash_stats["max_pending"], password_hash_stats["pending"])
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(password_executor, verify_password, plain_password, hashed_password)
+    finally:
+        password_hash_stats["pending"] -= 1
+        password_hash_stats["completed"] += 1
+
+def get_password_hash_stats():
+    pending = password_hash_stats["pending"]
+    return {
+        "workers": PASSWORD_HASH_WORKERS,
+        "max_queue": PASSWORD_HASH_MAX_QUEUE,
+        "in_progress": min(pending, PASSWORD_HASH_WORKERS),
+        "queued": max(0, pending - PASSWORD_HASH_WORKERS),
+        "max_pending": password_hash_stats["max_pending"],
+        "completed": password_hash_stats["completed"],
+        "rejected": password_hash_stats["rejected"],
+    }
+
 def get_user(db, username: str):
     if username in db:
         user_dict = db[username]
         return UserInDB(**user_dict)
     return None
 
-def authenticate_user(fake_db, username: str, password: str):
+async def authenticate_user(fake_db, username: str, password: str):
     user = get_user(fake_db, username)
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    if not await verify_password_async(password, user.hashed_password):
         return False
     return user
 
@@ -78,7 +313,43 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(username: str, session_id: str, jti: str, expires_at: float):
+    """Issue a long-lived refresh token; it is accepted while it is its session's current token."""
+    to_encode = {
+        "sub": username,
+        "type": "refresh",
+        "sid": session_id,
+        "jti": jti,
+        "exp": int(expires_at),
+    }
+    return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+
+def create_token_pair(username: str, session_id: str, jti: str, expires_at: float):
+    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    access_token = create_access_token(
+        data={"sub": username}, expires_delta=access_token_expires
+    )
+    return {
+        "access_token": access_token,
+        "token_type": "bearer",
+        "refresh_token": create_refresh_token(username, session_id, jti, expires_at),
+    }
+
+def refresh_token_expiry() -> float:
+    return float(int(time.time() + REFRESH_TOKEN_EXPIRE_DAYS * 24 * 3600))
+
+# Refresh-token state that cannot be read is never treated as valid
+refresh_store_unavailable = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Token service temporarily unavailable, please retry",
+    headers={"Retry-After": "1"},
+)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
+    cached_user = token_cache.get(token)
+    if cached_user is not None:
+        return cached_user
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -87,7 +358,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
-        if username is None:
+        if username is None or payload.get("type") == "refresh":
             raise credentials_exception
         token_data = TokenData(username=username)
     except JWTError:
@@ -95,6 +366,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     user = get_user(fake_users_db, username=token_data.username)
     if user is None:
         raise credentials_exception
+    expires_at = payload.get("exp")
+    if expires_at is not None:
+        token_cache.set(token, user, expires_at=float(expires_at))
     return user
 
 async def get_current_active_user(current_user: User = Depends(get_current_user)):
@@ -102,113 +376,551 @@ async def get_current_active_user(current_user: User = Depends(get_current_user)
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+async def get_rate_limited_user(request: Request, current_user: User = Depends(get_current_active_user)):
+    """Authenticate and charge one token from the user's bucket for the matched route.
+
+    A /batch sub-request is covered by the batch's own charge unless its route has a
+    limit of its own in ``RATE_LIMITS`` (e.g. TTS), which still applies to it.
+    """
+    route = request.scope["route"].path
+    if RATE_LIMIT_ENABLED and (route in RATE_LIMITS or not internal_requests.matches(request.scope)):
+        retry_after = rate_limiter.check(current_user.username, route)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Rate limit exceeded",
+                headers={"Retry-After": str(max(1, math.ceil(min(retry_after, 3600))))},
+            )
+    return current_user
+
+async def get_current_admin_user(current_user: User = Depends(get_current_active_user)):
+    if current_user.username not in ADMIN_USERNAMES:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    for upstream in UPSTREAMS:
+        upstream.open()
+    await cache_purges.start(purge_cached_responses)
+    # In-process client used by /batch to dispatch sub-requests to this app's own routes
+    app.state.internal_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app, raise_app_exceptions=False),
+        base_url="http://gateway",
+    )
+    yield
+    await app.state.internal_client.aclose()
+    await cache_purges.stop()
+    for upstream in UPSTREAMS:
+        await upstream.aclose()
+
 # Initialize FastAPI
-app = FastAPI(title="Travel Assistant API Gateway")
+app = FastAPI(
+    title="Travel Assistant API Gateway",
+    lifespan=lifespan,
+    default_response_class=fastjson.response_class()
+)
+app.add_middleware(BodySizeLimitMiddleware, max_body_bytes=GATEWAY_MAX_BODY_BYTES)
+app.add_middleware(
+    AdmissionControlMiddleware,
+    control=admission_control,
+    exempt_prefixes=("/metrics", "/admin"),
+    internal=internal_requests,
+)
+instrumentation.install(app, "api_gateway")
+
+# Upstream failures surface as gateway errors instead of unhandled exceptions
+@app.exception_handler(UpstreamUnavailable)
+async def upstream_unavailable_handler(request: Request, exc: UpstreamUnavailable):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, int(exc.retry_after)))},
+    )
+
+@app.exception_handler(httpx.TimeoutException)
+async def upstream_timeout_handler(request: Request, exc: httpx.TimeoutException):
+    return JSONResponse(
+        status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+        content={"detail": "Upstream service timed out"},
+    )
+
+@app.exception_handler(httpx.InvalidURL)
+async def upstream_invalid_url_handler(request: Request, exc: httpx.InvalidURL):
+    # A path parameter that cannot form a valid upstream URL (e.g. control characters)
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"detail": "Invalid characters in request path"},
+    )
+
+@app.exception_handler(httpx.TransportError)
+async def upstream_error_handler(request: Request, exc: httpx.TransportError):
+    return JSONResponse(
+        status_code=status.HTTP_502_BAD_GATEWAY,
+        content={"detail": f"Upstream service error: {type(exc).__name__}"},
+    )
 
 # Authentication endpoints
 @app.post("/token", response_model=Token)
 async def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = authenticate_user(fake_users_db, form_data.username, form_data.password)
+    user = await authenticate_user(fake_users_db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = create_access_token(
-        data={"sub": user.username}, expires_delta=access_token_expires
+    expires_at = refresh_token_expiry()
+    try:
+        session_id, jti = await refresh_token_store.start(user.username, expires_at)
+    except sqlite3.Error as e:
+        print(f"Error starting refresh token session: {str(e)}")
+        raise refresh_store_unavailable
+    return create_token_pair(user.username, session_id, jti, expires_at)
+
+@app.post("/token/refresh", response_model=Token)
+async def refresh_access_token(request: RefreshTokenRequest):
+    """Exchange a refresh token for a new access/refresh pair without a password check."""
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Invalid refresh token",
+        headers={"WWW-Authenticate": "Bearer"},
     )
-    return {"access_token": access_token, "token_type": "bearer"}
+    try:
+        payload = jwt.decode(request.refresh_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise credentials_exception
+    username = payload.get("sub")
+    session_id = payload.get("sid")
+    jti = payload.get("jti")
+    if payload.get("type") != "refresh" or username is None or session_id is None or jti is None:
+        raise credentials_exception
+    user = get_user(fake_users_db, username)
+    if user is None or user.disabled:
+        raise credentials_exception
+
+    # Rotate: the presented token can no longer be used, and replaying it ends the session
+    expires_at = refresh_token_expiry()
+    try:
+        new_jti = await refresh_token_store.rotate(session_id, user.username, jti, expires_at)
+    except sqlite3.Error as e:
+        print(f"Error rotating refresh token: {str(e)}")
+        raise refresh_store_unavailable
+    if new_jti is None:
+        raise credentials_exception
+    return create_token_pair(user.username, session_id, new_jti, expires_at)
 
 @app.get("/users/me", response_model=User)
 async def read_users_me(current_user: User = Depends(get_current_active_user)):
     return current_user
 
+# Upstream response headers that are forwarded unchanged to the client
+PASSTHROUGH_HEADERS = ("content-type", "content-encoding", "content-length", "cache-control", "etag", "retry-after")
+
+# Proxy helpers
+def json_content(upstream_response: httpx.Response):
+    """Body and content type of a buffered upstream response, MessagePack re-encoded as JSON."""
+    content_type = upstream_response.headers.get("content-type")
+    if wire.is_msgpack(content_type):
+        return wire.transcode_to_json(upstream_response.content), "application/json"
+    return upstream_response.content, content_type
+
+async def proxy(upstream: Upstream, method: str, path: str, coalesce: bool = False, **kwargs: Any) -> Response:
+    """Relay an upstream response to the client without decoding or re-serializing its body.
+
+    Status, content type and content encoding are preserved. Plain calls stream the raw
+    upstream bytes through as they arrive; coalesced calls are shared between callers,
+    so their (already received) body is sent as-is instead. MessagePack answers (see
+    ``INTERNAL_TRANSPORT``) are the exception: they are read and re-encoded as JSON.
+    """
+    if coalesce:
+        upstream_response = await upstream.request(method, path, coalesce=True, **kwargs)
+        # httpx has already decoded any content-encoding and knows the final length
+        headers = {
+            name: upstream_response.headers[name]
+            for name in ("cache-control", "etag", "retry-after")
+            if name in upstream_response.headers
+        }
+        content, media_type = json_content(upstream_response)
+        return Response(
+            content=content,
+            status_code=upstream_response.status_code,
+            headers=headers,
+            media_type=media_type,
+        )
+
+    upstream_response = await upstream.stream(method, path, **kwargs)
+    if wire.is_msgpack(upstream_response.headers.get("content-type")):
+        try:
+            await upstream_response.aread()
+        finally:
+            await upstream_response.aclose()
+        content, media_type = json_content(upstream_response)
+        return Response(content=content, status_code=upstream_response.status_code, media_type=media_type)
+    headers = {
+        name: upstream_response.headers[name]
+        for name in PASSTHROUGH_HEADERS
+        if name in upstream_response.headers
+    }
+    return StreamingResponse(
+        upstream_response.aiter_raw(),
+        status_code=upstream_response.status_code,
+        headers=headers,
+        background=BackgroundTask(upstream_response.aclose),
+    )
+
+# Response cache helpers
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+def purge_cached_responses(upstream: Optional[str] = None) -> int:
+    """Drop this worker's cached responses of ``upstream`` (all when None); return how many."""
+    if upstream is None:
+        purged = len(response_cache)
+        response_cache.clear()
+        return purged
+    keys = [key for key in response_cache.keys() if key[0] == upstream]
+    for key in keys:
+        response_cache.pop(key)
+    return len(keys)
+
+async def cached_get(
+    request: Request,
+    upstream: Upstream,
+    path: str,
+    route: str,
+    params: Optional[Dict[str, str]] = None,
+    upstream_route: Optional[str] = None,
+) -> Response:
+    """Serve an upstream GET from the response cache, answering 304 when the client's ETag matches.
+
+    ``upstream_route`` is the service route template of ``path`` when it has variables,
+    so all its calls share one latency window for hedging.
+    """
+    ttl = RESPONSE_CACHE_TTLS[route]
+    key = (upstream.name, path, tuple(sorted(params.items())) if params else ())
+    cached = response_cache.get(key)
+    if cached is None:
+        # Concurrent misses for the same entry share one upstream call
+        upstream_response = await upstream.get(path, params=params, coalesce=True, route=upstream_route)
+        body, media_type = json_content(upstream_response)
+        cached = CachedResponse(
+            status_code=upstream_response.status_code,
+            body=body,
+            media_type=media_type,
+            etag='"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"',
+        )
+        # Errors are passed through but never cached
+        if upstream_response.status_code != 200:
+            return Response(content=body, status_code=cached.status_code, media_type=cached.media_type)
+        response_cache.set(key, cached, ttl=ttl)
+
+    headers = {"ETag": cached.etag, "Cache-Control": f"private, max-age={int(ttl)}"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(
+        content=cached.body,
+        status_code=cached.status_code,
+        media_type=cached.media_type,
+        headers=headers,
+    )
+
+# Trip bundle helpers
+async def fetch_section(name: str, call: Awaitable) -> Dict[str, Any]:
+    """Await one upstream call of a bundle, capturing its result or error and duration."""
+    start = time.perf_counter()
+    data, error = None, None
+    try:
+        response = await call
+        if response.status_code == 200:
+            data = wire.decode(response.content, response.headers.get("content-type"))
+        else:
+            try:
+                error = response.json().get("detail", response.text)
+            except ValueError:
+                error = response.text
+            error = f"{response.status_code}: {error}"
+    except Exception as e:
+        error = f"{type(e).__name__}: {str(e)}"
+    return {
+        "name": name,
+        "data": data,
+        "error": error,
+        "duration_ms": (time.perf_counter() - start) * 1000,
+    }
+
+def filter_phrase_translations(phrases: List[dict], language: str) -> List[dict]:
+    # Phrase translations are keyed by base language ("ja"); Mandarin is stored as "zh"
+    base_language = language.split("-")[0].lower()
+    if base_language == "cmn":
+        base_language = "zh"
+    for phrase in phrases:
+        translations = phrase.get("translations", {})
+        phrase["translations"] = {
+            code: details for code, details in translations.items() if code == base_language
+        }
+    return phrases
+
+# Batch helpers
+def batch_route(method: str, path: str) -> Optional[str]:
+    """Return the template of the gateway route ``path`` resolves to, if it may run in a batch.
+
+    Paths are matched as given: dot segments, empty segments, percent-encoding and query
+    strings are refused, since the HTTP client would otherwise rewrite the path (e.g.
+    resolve ``/translate/../admin/stats``) after it was checked.
+    """
+    if not path.startswith("/") or any(character in path for character in "%?#\\"):
+        return None
+    if any(segment in ("", ".", "..") for segment in path[1:].split("/")):
+        return None
+    scope = {"type": "http", "method": method, "path": path, "root_path": ""}
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            template = getattr(route, "path", None)
+            return template if (method, template) in BATCH_ALLOWED_ROUTES else None
+    return None
+
+async def run_batch_sub_request(
+    client: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    sub_request: BatchSubRequest,
+    authorization: str,
+) -> Dict[str, Any]:
+    method = sub_request.method.upper()
+    if batch_route(method, sub_request.path) is None:
+        return {"status": 400, "body": {"detail": f"Route not allowed in batch: {method} {sub_request.path}"}}
+
+    async with semaphore:
+        response = await client.request(
+            method,
+            sub_request.path,
+            params=sub_request.params or None,
+            json=sub_request.body if method == "POST" else None,
+            headers={"Authorization": authorization, **internal_requests.headers()},
+        )
+    try:
+        body = response.json()
+    except ValueError:
+        body = response.text
+    return {"status": response.status_code, "body": body}
+
+# Admin endpoints
+@app.get("/admin/stats")
+async def get_gateway_stats(current_user: User = Depends(get_current_admin_user)):
+    # Every worker process has its own caches and limiters; report which one answered
+    return {
+        "pid": os.getpid(),
+        "token_cache": token_cache.stats(),
+        "response_cache": response_cache.stats(),
+        "password_hashing": get_password_hash_stats(),
+        "refresh_tokens": refresh_token_store.stats(),
+        "cache_purges": cache_purges.stats(),
+        "rate_limiting": rate_limiter.stats(),
+        "admission_control": admission_control.stats(),
+        "upstreams": {upstream.name: upstream.stats() for upstream in UPSTREAMS}
+    }
+
+@app.delete("/admin/cache")
+async def purge_response_cache(
+    upstream: Optional[str] = Query(None, description="Only purge entries of this upstream (translation, map, packing)"),
+    current_user: User = Depends(get_current_admin_user)
+):
+    # "purged" counts this worker's entries; the other workers follow within seconds
+    purged = purge_cached_responses(upstream)
+    try:
+        await cache_purges.publish(upstream)
+    except sqlite3.Error as e:
+        print(f"Error publishing cache purge: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Cache purged on one worker only, please retry",
+            headers={"Retry-After": "1"},
+        )
+    return {"purged": purged}
+
+@app.delete("/admin/translation-cache")
+async def purge_translation_cache(
+    text: Optional[str] = Query(None, description="Only remove translations of this text"),
+    source_language: Optional[str] = Query(None, description="Only remove translations from this language"),
+    target_language: Optional[str] = Query(None, description="Only remove translations into this language"),
+    current_user: User = Depends(get_current_admin_user)
+):
+    params = {
+        name: value
+        for name, value in (("text", text), ("source_language", source_language), ("target_language", target_language))
+        if value is not None
+    }
+    return await proxy(translation_upstream, "DELETE", "/translate/cache", params=params)
+
 # Translation Service Routes
 @app.post("/translate/text")
-async def translate_text(data: dict, current_user: User = Depends(get_current_active_user)):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{TRANSLATION_SERVICE_URL}/translate/text", json=data)
-        return response.json()
+async def translate_text(data: TranslationRequest, current_user: User = Depends(get_rate_limited_user)):
+    return await proxy(
+        translation_upstream, "POST", "/translate/text",
+        json=data.model_dump(exclude_unset=True), coalesce=True
+    )
+
+@app.post("/translate/batch")
+async def translate_batch(data: BatchTranslationRequest, current_user: User = Depends(get_rate_limited_user)):
+    return await proxy(
+        translation_upstream, "POST", "/translate/batch",
+        json=data.model_dump(exclude_unset=True), coalesce=True
+    )
 
 @app.post("/translate/tts")
-async def text_to_speech(data: dict, current_user: User = Depends(get_current_active_user)):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{TRANSLATION_SERVICE_URL}/translate/tts", json=data)
-        return response.json()
+async def text_to_speech(data: TTSRequest, current_user: User = Depends(get_rate_limited_user)):
+    return await proxy(
+        translation_upstream, "POST", "/translate/tts",
+        json=data.model_dump(exclude_unset=True), coalesce=True
+    )
 
 @app.get("/translate/languages")
-async def get_languages(current_user: User = Depends(get_current_active_user)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{TRANSLATION_SERVICE_URL}/languages")
-        return response.json()
+async def get_languages(request: Request, current_user: User = Depends(get_rate_limited_user)):
+    return await cached_get(request, translation_upstream, "/languages", "languages")
 
 @app.get("/translate/voices/{language_code}")
-async def get_voices(language_code: str, current_user: User = Depends(get_current_active_user)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{TRANSLATION_SERVICE_URL}/voices/{language_code}")
-        return response.json()
+async def get_voices(language_code: str, request: Request, current_user: User = Depends(get_rate_limited_user)):
+    return await cached_get(
+        request, translation_upstream, f"/voices/{language_code}", "voices",
+        upstream_route="/voices/{language_code}"
+    )
 
 @app.get("/translate/common-phrases")
-async def get_common_phrases(limit: int = 50, skip: int = 0, current_user: User = Depends(get_current_active_user)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{TRANSLATION_SERVICE_URL}/common-phrases", 
-            params={"limit": limit, "skip": skip}
-        )
-        return response.json()
+async def get_common_phrases(limit: int = 50, skip: int = 0, current_user: User = Depends(get_rate_limited_user)):
+    return await proxy(
+        translation_upstream, "GET", "/common-phrases",
+        params={"limit": limit, "skip": skip}
+    )
 
 @app.get("/translate/common-phrases/categories")
-async def get_phrase_categories(current_user: User = Depends(get_current_active_user)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{TRANSLATION_SERVICE_URL}/common-phrases/categories")
-        return response.json()
+async def get_phrase_categories(request: Request, current_user: User = Depends(get_rate_limited_user)):
+    return await cached_get(request, translation_upstream, "/common-phrases/categories", "phrase_categories")
 
 @app.get("/translate/common-phrases/by-category/{category}")
 async def get_phrases_by_category(
     category: str, 
-    current_user: User = Depends(get_current_active_user)
+    request: Request,
+    current_user: User = Depends(get_rate_limited_user)
 ):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{TRANSLATION_SERVICE_URL}/common-phrases/by-category/{category}"
-        )
-        return response.json()
+    return await cached_get(
+        request, translation_upstream, f"/common-phrases/by-category/{category}", "phrases_by_category",
+        upstream_route="/common-phrases/by-category/{category}"
+    )
 
 @app.get("/translate/common-phrases/{phrase_id}")
 async def get_phrase_by_id(
     phrase_id: str, 
-    current_user: User = Depends(get_current_active_user)
+    current_user: User = Depends(get_rate_limited_user)
 ):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{TRANSLATION_SERVICE_URL}/common-phrases/{phrase_id}"
-        )
-        return response.json()
+    return await proxy(
+        translation_upstream, "GET", f"/common-phrases/{phrase_id}", route="/common-phrases/{phrase_id}"
+    )
 
 # Map Service Routes
 @app.get("/map/places")
-async def get_famous_places(location: str, current_user: User = Depends(get_current_active_user)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{MAP_SERVICE_URL}/places", params={"location": location})
-        return response.json()
+async def get_famous_places(location: str, request: Request, current_user: User = Depends(get_rate_limited_user)):
+    # The map service matches locations case-insensitively, so share one cache entry
+    return await cached_get(request, map_upstream, "/places", "places", params={"location": location.lower()})
 
 @app.get("/map/directions")
-async def get_directions(origin: str, destination: str, current_user: User = Depends(get_current_active_user)):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{MAP_SERVICE_URL}/directions", 
-            params={"origin": origin, "destination": destination}
-        )
-        return response.json()
+async def get_directions(origin: str, destination: str, current_user: User = Depends(get_rate_limited_user)):
+    return await proxy(
+        map_upstream, "GET", "/directions",
+        params={"origin": origin, "destination": destination}
+    )
 
 # Packing List Service Routes
 @app.post("/packing/generate")
-async def generate_packing_list(data: dict, current_user: User = Depends(get_current_active_user)):
-    async with httpx.AsyncClient() as client:
-        response = await client.post(f"{PACKING_SERVICE_URL}/generate", json=data)
-        return response.json()
+async def generate_packing_list(data: PackingListRequest, current_user: User = Depends(get_rate_limited_user)):
+    return await proxy(
+        packing_upstream, "POST", "/generate",
+        json=data.model_dump(exclude_unset=True), coalesce=True
+    )
+
+# Combined Routes
+@app.post("/trip/bundle")
+async def get_trip_bundle(
+    request: TripBundleRequest,
+    response: Response,
+    current_user: User = Depends(get_rate_limited_user)
+):
+    """Fetch places, a packing list and common phrases for a trip in one round trip.
+
+    The three services are called concurrently; a failing section is returned as
+    ``null`` with its error in ``errors`` instead of failing the whole bundle.
+    """
+    sections = await asyncio.gather(
+        fetch_section(
+            "places",
+            map_upstream.get("/places", params={"location": request.destination.lower()}, coalesce=True)
+        ),
+        fetch_section(
+            "packing",
+            packing_upstream.post(
+                "/generate",
+                json={
+                    "destination": request.destination,
+                    "duration": request.duration,
+                    "season": request.season,
+                    "trip_type": request.trip_type,
+                    "activities": request.activities,
+                },
+                coalesce=True
+            )
+        ),
+        fetch_section(
+            "phrases",
+            translation_upstream.get(
+                "/common-phrases", params={"limit": request.phrase_limit, "skip": 0}, coalesce=True
+            )
+        ),
+    )
+
+    bundle = {"destination": request.destination, "errors": {}}
+    for section in sections:
+        bundle[section["name"]] = section["data"]
+        if section["error"] is not None:
+            bundle["errors"][section["name"]] = section["error"]
+    if request.language and bundle["phrases"] is not None:
+        bundle["phrases"] = filter_phrase_translations(bundle["phrases"], request.language)
+
+    response.headers["Server-Timing"] = ", ".join(
+        f'{section["name"]};dur={section["duration_ms"]:.1f}' for section in sections
+    )
+    return bundle
+
+@app.post("/batch")
+async def run_batch(
+    batch: BatchRequest,
+    request: Request,
+    current_user: User = Depends(get_rate_limited_user)
+):
+    """Execute several gateway requests in one round trip and return their results in order.
+
+    Sub-requests reuse the caller's bearer token, which was verified for this request and
+    is answered from the token cache for each of them, and run with bounded concurrency
+    over the gateway's pooled upstream clients.
+    """
+    if len(batch.requests) > BATCH_MAX_REQUESTS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"A batch may contain at most {BATCH_MAX_REQUESTS} requests"
+        )
+    semaphore = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+    responses = await asyncio.gather(*(
+        run_batch_sub_request(
+            request.app.state.internal_client,
+            semaphore,
+            sub_request,
+            request.headers["authorization"],
+        )
+        for sub_request in batch.requests
+    ))
+    return {"responses": responses}
 
 @app.get("/")
 async def root():
@@ -216,9 +928,11 @@ async def root():
         "service": "Travel Assistant API Gateway",
         "version": "1.0.0",
         "endpoints": {
-            "authentication": ["/token"],
+            "authentication": ["/token", "/token/refresh"],
+            "admin": ["/admin/stats", "/admin/cache", "/admin/translation-cache"],
             "translation": [
                 "/translate/text",
+                "/translate/batch",
                 "/translate/tts",
                 "/translate/languages",
                 "/translate/voices/{language_code}",
@@ -233,6 +947,10 @@ async def root():
             ],
             "packing": [
                 "/packing/generate"
+            ],
+            "combined": [
+                "/trip/bundle",
+                "/batch"
             ]
         }
     }
@@ -0,0 +1,255 @@
+"""Per-user rate limiting, global admission control and request size limits for the API gateway."""
+import json
+import math
+import secrets
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from cache import LRUCache
+
+# Buckets of users that stay idle this long are dropped (a fresh bucket is full anyway)
+BUCKET_IDLE_TTL = 600
+
+
+def parse_rate(value: str) -> Tuple[float, float]:
+    """Parse ``"<tokens per second>/<burst>"``, e.g. ``"5/20"``; the burst defaults to the rate."""
+    rate, _, burst = value.partition("/")
+    rate = float(rate)
+    return rate, float(burst) if burst else max(rate, 1.0)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def consume(self) -> float:
+        """Take one token; return 0 if allowed, otherwise the seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        if self.rate <= 0:
+            return math.inf
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets keyed by (user, route), each route with its own rate and burst."""
+
+    def __init__(self, default: Tuple[float, float], routes: Dict[str, Tuple[float, float]], max_buckets: int):
+        self.default = default
+        self.routes = routes
+        self.buckets = LRUCache(maxsize=max_buckets, ttl=BUCKET_IDLE_TTL)
+        self.limited = 0
+
+    def check(self, user: str, route: str) -> float:
+        """Return 0 if the request may proceed, otherwise the suggested Retry-After in seconds."""
+        key = (user, route)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(*self.routes.get(route, self.default))
+        # Re-inserting refreshes the idle TTL and the LRU position
+        self.buckets.set(key, bucket)
+        retry_after = bucket.consume()
+        if retry_after:
+            self.limited += 1
+        return retry_after
+
+    def stats(self) -> Dict[str, float]:
+        return {"buckets": len(self.buckets), "limited": self.limited}
+
+
+class AdmissionControl:
+    """Global overload thresholds and counters shared with :class:`AdmissionControlMiddleware`.
+
+    A threshold of 0 disables that check.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        max_event_loop_lag: float,
+        event_loop_lag: Callable[[], float],
+        retry_after: int = 1,
+    ):
+        self.max_in_flight = max_in_flight
+        self.max_event_loop_lag = max_event_loop_lag
+        self.event_loop_lag = event_loop_lag
+        self.retry_after = retry_after
+        self.in_flight = 0
+        self.shed = 0
+
+    def overloaded(self) -> Optional[str]:
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return "Too many requests in flight"
+        if self.max_event_loop_lag and self.event_loop_lag() > self.max_event_loop_lag:
+            return "Gateway is overloaded"
+        return None
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "event_loop_lag": round(self.event_loop_lag(), 4),
+            "max_event_loop_lag": self.max_event_loop_lag,
+            "shed": self.shed,
+        }
+
+
+class InternalRequests:
+    """Marks requests the gateway sends to itself, such as ``/batch`` sub-requests.
+
+    They carry a random per-process secret in ``HEADER``, which outside clients cannot
+    forge, so the limits the outer request was already charged for can be skipped.
+    """
+
+    HEADER = "x-gateway-internal"
+
+    def __init__(self):
+        self.token = secrets.token_urlsafe(32)
+
+    def headers(self) -> Dict[str, str]:
+        return {self.HEADER: self.token}
+
+    def matches(self, scope) -> bool:
+        name = self.HEADER.encode("latin-1")
+        token = self.token.encode("latin-1")
+        return any(
+            key == name and secrets.compare_digest(value, token)
+            for key, value in scope.get("headers", ())
+        )
+
+
+class AdmissionControlMiddleware:
+    """Shed load with 503 + Retry-After while :class:`AdmissionControl` reports overload.
+
+    Paths starting with one of ``exempt_prefixes`` (metrics, admin) are always admitted
+    so the gateway stays observable while it is shedding. Requests marked by
+    ``internal`` were admitted (and counted) as part of their outer request and pass through.
+    """
+
+    def __init__(
+        self,
+        app,
+        control: AdmissionControl,
+        exempt_prefixes: Tuple[str, ...] = (),
+        internal: Optional[InternalRequests] = None,
+    ):
+        self.app = app
+        self.control = control
+        self.exempt_prefixes = exempt_prefixes
+        self.internal = internal
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith(self.exempt_prefixes)
+            or (self.internal is not None and self.internal.matches(scope))
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        control = self.control
+        reason = control.overloaded()
+        if reason is not None:
+            control.shed += 1
+            body = json.dumps({"detail": reason}).encode("utf-8")
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode("latin-1")),
+                    (b"retry-after", str(control.retry_after).encode("latin-1")),
+                ],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        control.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            control.in_flight -= 1
+
+
+class BodyTooLarge(Exception):
+    """Raised from ``receive`` once a streamed request body exceeds the limit."""
+
+
+class BodySizeLimitMiddleware:
+    """Reject request bodies larger than ``max_body_bytes`` with 413 before they are parsed.
+
+    The declared Content-Length is checked up front; chunked bodies are counted while
+    they are received.
+    """
+
+    def __init__(self, app, max_body_bytes: int):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.max_body_bytes:
+            await self.app(scope, receive, send)
+            return
+
+        for name, value in scope["headers"]:
+            if name == b"content-length":
+                try:
+                    declared = int(value)
+                except ValueError:
+                    declared = 0
+                if declared > self.max_body_bytes:
+                    await self._reject(send)
+                    return
+                break
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    too_large = True
+                    raise BodyTooLarge()
+            return message
+
+        async def limited_send(message):
+            nonlocal response_started
+            if too_large:
+                # The framework turned the aborted body read into its own error
+                # response; answer with 413 instead
+                if message["type"] == "http.response.start" and not response_started:
+                    response_started = True
+                    await self._reject(send)
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, limited_send)
+        except BodyTooLarge:
+            if not response_started:
+                await self._reject(send)
+
+    async def _reject(self, send):
+        body = json.dumps({"detail": f"Request body exceeds {self.max_body_bytes} bytes"}).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,92 @@
+"""Refresh-token rotation state shared by all gateway workers and kept across restarts.
+
+Each login starts a session whose refresh tokens form a chain: only the newest token
+(its ``jti``) may be exchanged, and exchanging it atomically replaces the session's
+current ``jti`` with the next one. A superseded token presented again (a replay)
+ends the whole session, and a session that is unknown — expired, ended, or lost
+with the database — is refused. One row is kept per session, not per rotation,
+until the session's last refresh token expires.
+
+The rows live in a SQLite file (``REFRESH_TOKEN_DB``) so every worker process sees
+the same state. Queries run on a single worker thread, off the event loop.
+"""
+import os
+import secrets
+import sqlite3
+import time
+from typing import Any, Dict, Optional, Tuple
+
+from sqlite_worker import SqliteWorker
+
+REFRESH_TOKEN_DB = os.getenv("REFRESH_TOKEN_DB", "refresh_tokens.sqlite3")
+# Expired sessions are pruned after this many new sessions
+PRUNE_EVERY = 1000
+
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS refresh_sessions ("
+    " session_id TEXT PRIMARY KEY, username TEXT NOT NULL,"
+    " jti TEXT NOT NULL, expires_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS refresh_sessions_expires_at ON refresh_sessions (expires_at)",
+)
+
+
+class RefreshTokenStore:
+    def __init__(self, db_path: str = REFRESH_TOKEN_DB):
+        self.db = SqliteWorker(db_path, SCHEMA, "refresh-tokens")
+        self._sessions_started = 0
+        self.rotations = 0
+        self.rejected = 0
+        self.replays = 0
+
+    async def start(self, username: str, expires_at: float) -> Tuple[str, str]:
+        """Start a session for a fresh login; return its ``(session_id, jti)``."""
+        session_id, jti = secrets.token_urlsafe(16), secrets.token_urlsafe(16)
+        await self.db.run(self._insert, session_id, username, jti, expires_at)
+        return session_id, jti
+
+    def _insert(self, db: sqlite3.Connection, session_id: str, username: str, jti: str, expires_at: float) -> None:
+        db.execute(
+            "INSERT INTO refresh_sessions (session_id, username, jti, expires_at) VALUES (?, ?, ?, ?)",
+            (session_id, username, jti, expires_at),
+        )
+        self._sessions_started += 1
+        if self._sessions_started % PRUNE_EVERY == 0:
+            db.execute("DELETE FROM refresh_sessions WHERE expires_at <= ?", (time.time(),))
+
+    async def rotate(self, session_id: str, username: str, jti: str, expires_at: float) -> Optional[str]:
+        """Exchange the session's current ``jti`` for a new one.
+
+        Returns None, and ends the session on a replay, when ``jti`` is not the current
+        token of a live session of ``username``.
+        """
+        new_jti = secrets.token_urlsafe(16)
+        rotated = await self.db.run(self._swap, session_id, username, jti, new_jti, expires_at)
+        if rotated:
+            self.rotations += 1
+            return new_jti
+        self.rejected += 1
+        return None
+
+    def _swap(
+        self, db: sqlite3.Connection, session_id: str, username: str, jti: str, new_jti: str, expires_at: float
+    ) -> bool:
+        # Compare-and-swap, so two workers cannot both exchange the same token
+        cursor = db.execute(
+            "UPDATE refresh_sessions SET jti = ?, expires_at = ?"
+            " WHERE session_id = ? AND username = ? AND jti = ? AND expires_at > ?",
+            (new_jti, expires_at, session_id, username, jti, time.time()),
+        )
+        if cursor.rowcount == 1:
+            return True
+        # An older token of a live session was replayed: whoever holds the chain is suspect
+        cursor = db.execute(
+            "DELETE FROM refresh_sessions WHERE session_id = ? AND username = ? AND jti != ?",
+            (session_id, username, jti),
+        )
+        if cursor.rowcount:
+            self.replays += 1
+        return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rotations": self.rotations, "rejected": self.rejected, "replays": self.replays}
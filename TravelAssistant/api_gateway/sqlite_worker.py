@@ -0,0 +1,48 @@
+"""A SQLite connection for state shared by the gateway's worker processes."""
+import asyncio
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sequence, TypeVar
+
+T = TypeVar("T")
+
+
+class SqliteWorker:
+    """Runs queries on one connection from a single thread, off the event loop.
+
+    The database is opened lazily in WAL mode and ``schema`` statements (e.g. ``CREATE
+    TABLE IF NOT EXISTS``) run on the first query. Connections and threads must not
+    cross fork(), so a process forked from one that already used the database opens
+    its own on its first query.
+    """
+
+    def __init__(self, db_path: str, schema: Sequence[str], thread_name_prefix: str):
+        self.db_path = db_path
+        self.schema = schema
+        self.thread_name_prefix = thread_name_prefix
+        self._db: Optional[sqlite3.Connection] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix=self.thread_name_prefix)
+            self._db = None
+            self._pid = os.getpid()
+        return self._pool
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            for statement in self.schema:
+                db.execute(statement)
+            self._db = db
+        return self._db
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """Call ``fn(connection, *args)`` on the worker thread and return its result."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor(), lambda: fn(self._connection(), *args)
+        )
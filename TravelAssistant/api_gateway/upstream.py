@@ -0,0 +1,537 @@
+"""Long-lived HTTP clients for the services behind the API gateway."""
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+
+import httpx
+
+from instrumentation import inject_traceparent, track_dependency
+
+# Connection pool configuration shared by every upstream client
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", "100"))
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_KEEPALIVE_CONNECTIONS", "20"))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.getenv("UPSTREAM_KEEPALIVE_EXPIRY", "30"))
+UPSTREAM_CONNECT_TIMEOUT = float(os.getenv("UPSTREAM_CONNECT_TIMEOUT", "2"))
+# HTTP/2 is only negotiated over TLS (ALPN); plain http:// upstreams keep using HTTP/1.1
+UPSTREAM_HTTP2 = os.getenv("UPSTREAM_HTTP2", "false").lower() in ("1", "true", "yes")
+# Let identical concurrent requests share a single upstream call
+UPSTREAM_COALESCE = os.getenv("UPSTREAM_COALESCE", "true").lower() in ("1", "true", "yes")
+
+# Circuit breaker: open when the error rate over the last calls crosses the threshold
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_THRESHOLD = float(os.getenv("BREAKER_ERROR_THRESHOLD", "0.5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))
+
+# Hedged GETs: send a second attempt if the first is slower than the observed p95
+UPSTREAM_HEDGE = os.getenv("UPSTREAM_HEDGE", "false").lower() in ("1", "true", "yes")
+UPSTREAM_HEDGE_MIN_DELAY = float(os.getenv("UPSTREAM_HEDGE_MIN_DELAY", "0.05"))
+LATENCY_SAMPLES = 200
+# Routes per upstream with their own latency window (further routes are never hedged)
+LATENCY_ROUTES = 64
+# New latency samples between two recomputations of the p95
+P95_REFRESH_SAMPLES = 10
+
+# Replica selection: "least_outstanding" or "p2c" (power of two choices)
+UPSTREAM_BALANCER = os.getenv("UPSTREAM_BALANCER", "least_outstanding").lower()
+# Active health checks of replicas (only run when a service has more than one replica)
+HEALTH_CHECK_INTERVAL = float(os.getenv("HEALTH_CHECK_INTERVAL", "5"))
+HEALTH_CHECK_TIMEOUT = float(os.getenv("HEALTH_CHECK_TIMEOUT", "2"))
+HEALTH_CHECK_PATH = os.getenv("HEALTH_CHECK_PATH", "/")
+HEALTH_CHECK_FAILURES = int(os.getenv("HEALTH_CHECK_FAILURES", "3"))
+HEALTH_CHECK_PASSES = int(os.getenv("HEALTH_CHECK_PASSES", "2"))
+# Service label of the gateway→service hop metrics
+METRICS_SERVICE = "api_gateway"
+HEDGE_MIN_SAMPLES = 20
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without calling the upstream while its circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Upstream '{name}' is unavailable (circuit open)")
+        self.name = name
+        self.retry_after = retry_after
+
+
+def is_backpressure(response: httpx.Response) -> bool:
+    """503 + Retry-After: the service is up but deliberately refusing work for now."""
+    return response.status_code == 503 and "retry-after" in response.headers
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker driven by the error rate of the most recent calls.
+
+    While open every call fails fast. After ``reset_timeout`` one trial call is let
+    through (half-open); its outcome closes the breaker again or re-opens it.
+    """
+
+    def __init__(self):
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.outcomes: deque = deque(maxlen=BREAKER_WINDOW)
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    def retry_after(self) -> float:
+        return max(0.0, self.opened_at + BREAKER_RESET_TIMEOUT - time.monotonic())
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        if self.state == "open" and self.retry_after() == 0:
+            self.state = "half_open"
+        if self.state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record(self, success: bool) -> None:
+        if self.state == "half_open":
+            self.trial_in_flight = False
+            if success:
+                self.state = "closed"
+                self.outcomes.clear()
+            else:
+                self._open()
+            return
+        self.outcomes.append(success)
+        if len(self.outcomes) >= BREAKER_MIN_CALLS:
+            error_rate = self.outcomes.count(False) / len(self.outcomes)
+            if error_rate >= BREAKER_ERROR_THRESHOLD:
+                self._open()
+
+    def release(self) -> None:
+        """Forget a call that ended without an outcome (e.g. cancelled by the client)."""
+        if self.state == "half_open":
+            self.trial_in_flight = False
+
+    def _open(self) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        self.times_opened += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "recent_error_rate": round(self.outcomes.count(False) / len(self.outcomes), 4) if self.outcomes else 0.0,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "retry_after": round(self.retry_after(), 2) if self.state != "closed" else 0.0,
+        }
+
+
+class LatencyWindow:
+    """The most recent latencies of one route, with a lazily refreshed p95."""
+
+    def __init__(self):
+        self.samples: deque = deque(maxlen=LATENCY_SAMPLES)
+        self._p95: Optional[float] = None
+        # Samples recorded since the p95 was last computed
+        self._samples_since_p95 = 0
+
+    def add(self, elapsed: float) -> None:
+        self.samples.append(elapsed)
+        # Recompute the p95 lazily, at most once every P95_REFRESH_SAMPLES samples
+        self._samples_since_p95 += 1
+        if self._samples_since_p95 >= P95_REFRESH_SAMPLES:
+            self._samples_since_p95 = 0
+            self._p95 = None
+
+    def p95(self) -> Optional[float]:
+        """p95 latency in seconds, once enough successful calls were observed."""
+        if len(self.samples) < HEDGE_MIN_SAMPLES:
+            return None
+        if self._p95 is None:
+            ordered = sorted(self.samples)
+            self._p95 = ordered[int(0.95 * (len(ordered) - 1))]
+        return self._p95
+
+
+def _close_unused_response(task: "asyncio.Future[httpx.Response]") -> None:
+    if not task.cancelled() and task.exception() is None:
+        asyncio.ensure_future(task.result().aclose())
+
+
+class Replica:
+    """One instance of an upstream service, ejected after consecutive failed health checks."""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.healthy = True
+        self.outstanding = 0
+        self.requests = 0
+        self.consecutive_failures = 0
+        self.consecutive_passes = 0
+
+    def record_check(self, passed: bool) -> None:
+        if passed:
+            self.consecutive_failures = 0
+            self.consecutive_passes += 1
+            if not self.healthy and self.consecutive_passes >= HEALTH_CHECK_PASSES:
+                self.healthy = True
+        else:
+            self.consecutive_passes = 0
+            self.consecutive_failures += 1
+            if self.healthy and self.consecutive_failures >= HEALTH_CHECK_FAILURES:
+                self.healthy = False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+        }
+
+
+class Upstream:
+    """A single backend service reached through one pooled ``httpx.AsyncClient``.
+
+    The client is created by :meth:`open` from the application lifespan and reused
+    by every request, so connections are kept alive between calls instead of paying
+    a TCP connect and pool setup per proxied request.
+
+    Requests made with ``coalesce=True`` are single-flighted: while a call with the
+    same method, path, query and body is in flight, duplicates await its response
+    instead of being forwarded again.
+
+    Every call goes through a :class:`CircuitBreaker`; 5xx answers and transport
+    errors count as failures. With ``UPSTREAM_HEDGE`` enabled, a GET (buffered or
+    streamed) still pending after its route's recent p95 latency is raced against a
+    second attempt.
+
+    A service may have several replicas. Each attempt goes to the healthy replica with
+    the fewest outstanding requests (or the better of two random picks with
+    ``UPSTREAM_BALANCER=p2c``); replicas failing active health checks are ejected until
+    they pass again. If every replica is ejected, all of them are tried anyway.
+
+    In monolith mode the service's ASGI app lives in this process
+    (:meth:`use_asgi_app`) and is called through ``httpx.ASGITransport`` instead of
+    over a socket. That transport ignores httpx timeouts, so the upstream's budget is
+    enforced around each call instead and still ends in ``httpx.ReadTimeout``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        base_urls: Union[str, List[str]],
+        timeout: float,
+        headers: Optional[Dict[str, str]] = None,
+    ):
+        if isinstance(base_urls, str):
+            base_urls = [base_urls]
+        self.name = name
+        self.replicas = [Replica(url) for url in base_urls]
+        self.timeout = timeout
+        # Sent with every request, e.g. to negotiate the wire format
+        self.headers = headers
+        self.client: Optional[httpx.AsyncClient] = None
+        self.app = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._inflight: Dict[tuple, "asyncio.Future[httpx.Response]"] = {}
+        self.breaker = CircuitBreaker()
+        # Recent GET latencies per route, for hedging
+        self.latencies: Dict[str, LatencyWindow] = {}
+        self.requests = 0
+        self.coalesced = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.backpressure = 0
+
+    def use_asgi_app(self, app) -> None:
+        """Call ``app`` in-process instead of the configured URLs; must precede :meth:`open`."""
+        if self.client is not None:
+            raise RuntimeError(f"Upstream '{self.name}' is already open")
+        self.app = app
+        self.replicas = [Replica(f"http://{self.name}")]
+
+    def open(self) -> None:
+        if self.client is not None:
+            return
+        if self.app is not None:
+            self.client = httpx.AsyncClient(
+                # Unhandled service errors become 500 responses, as they would over HTTP
+                transport=httpx.ASGITransport(app=self.app, raise_app_exceptions=False),
+                timeout=self.timeout,
+                headers=self.headers,
+                event_hooks={"request": [inject_traceparent]},
+            )
+            return
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(self.timeout, connect=UPSTREAM_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_MAX_CONNECTIONS,
+                max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY,
+            ),
+            http2=UPSTREAM_HTTP2,
+            headers=self.headers,
+            # Continue the caller's trace in the service
+            event_hooks={"request": [inject_traceparent]},
+        )
+        if len(self.replicas) > 1 and HEALTH_CHECK_INTERVAL > 0:
+            self._health_task = asyncio.ensure_future(self._health_check_loop())
+
+    async def aclose(self) -> None:
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def request(
+        self, method: str, path: str, coalesce: bool = False, route: Optional[str] = None, **kwargs: Any
+    ) -> httpx.Response:
+        """Send a request and return the buffered response.
+
+        ``route`` names the service route for the latency samples that drive hedging
+        (e.g. ``/voices/{language_code}``); it defaults to ``path``.
+        """
+        if self.client is None:
+            raise RuntimeError(f"Upstream '{self.name}' used before the application started")
+        self.requests += 1
+        route = route or path
+        if not (coalesce and UPSTREAM_COALESCE):
+            return await self._send(method, path, route, **kwargs)
+
+        key = self._coalesce_key(method, path, kwargs)
+        task = self._inflight.get(key)
+        if task is None:
+            # The call runs as its own task so a disconnecting first caller does not
+            # cancel it for everyone else waiting on the same result
+            task = asyncio.ensure_future(self._send(method, path, route, **kwargs))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _send(self, method: str, path: str, route: str, **kwargs: Any) -> httpx.Response:
+        self._check_breaker()
+        start = time.perf_counter()
+        try:
+            def attempt(replica: Replica) -> Awaitable[httpx.Response]:
+                return self._attempt(method, path, replica, **kwargs)
+
+            with track_dependency(METRICS_SERVICE, self.name, method.upper()):
+                if self._hedges(method):
+                    response = await self._hedged(route, self._choose_replica(), attempt)
+                else:
+                    response = await attempt(self._choose_replica())
+        except httpx.TransportError:
+            self.breaker.record(False)
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self._record(response, time.perf_counter() - start, method, route)
+        return response
+
+    def _hedges(self, method: str) -> bool:
+        # Hedging only helps against a slow network or replica, not in-process calls
+        return UPSTREAM_HEDGE and self.app is None and method.upper() == "GET"
+
+    async def _hedged(
+        self,
+        route: str,
+        first_replica: Replica,
+        attempt: Callable[[Replica], Awaitable[httpx.Response]],
+    ) -> httpx.Response:
+        """Race a second attempt against ``attempt(first_replica)`` once it is slower than the route's p95."""
+        delay = self.hedge_delay(route)
+        first = asyncio.ensure_future(attempt(first_replica))
+        if delay is None:
+            return await first
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.hedged += 1
+        # Prefer another replica for the hedge when there is one
+        second = asyncio.ensure_future(attempt(self._choose_replica(exclude=first_replica)))
+        pending = {first, second}
+        winner = None
+        try:
+            while pending and winner is None:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                # Use the first attempt that actually produced a response
+                winner = next((task for task in done if task.exception() is None), None)
+            if winner is None:
+                # Both attempts failed: surface the original error
+                return first.result()
+            if winner is second:
+                self.hedge_wins += 1
+            return winner.result()
+        finally:
+            for task in (first, second):
+                if task is not winner:
+                    task.cancel()
+                    # A streamed response that arrived anyway still holds its connection
+                    task.add_done_callback(_close_unused_response)
+
+    async def _attempt(self, method: str, path: str, replica: Replica, **kwargs: Any) -> httpx.Response:
+        replica.outstanding += 1
+        replica.requests += 1
+        try:
+            return await self._within_budget(self.client.request(method, replica.url + path, **kwargs))
+        finally:
+            replica.outstanding -= 1
+
+    async def _attempt_stream(self, replica: Replica, request: httpx.Request) -> httpx.Response:
+        # Outstanding counts the wait for the response headers, not the body transfer
+        replica.outstanding += 1
+        replica.requests += 1
+        try:
+            return await self._within_budget(self.client.send(request, stream=True))
+        finally:
+            replica.outstanding -= 1
+
+    async def _within_budget(self, call: Awaitable[httpx.Response]) -> httpx.Response:
+        if self.app is None:
+            # Over the network the client's own timeouts apply
+            return await call
+        try:
+            return await asyncio.wait_for(call, self.timeout)
+        except asyncio.TimeoutError:
+            # Same exception as over HTTP, so the breaker and the 504 handler see it
+            raise httpx.ReadTimeout(f"Upstream '{self.name}' timed out after {self.timeout}s") from None
+
+    def _choose_replica(self, exclude: Optional[Replica] = None) -> Replica:
+        candidates = [replica for replica in self.replicas if replica.healthy] or self.replicas
+        if exclude is not None and len(candidates) > 1:
+            candidates = [replica for replica in candidates if replica is not exclude]
+        if len(candidates) == 1:
+            return candidates[0]
+        if UPSTREAM_BALANCER == "p2c":
+            first, second = random.sample(candidates, 2)
+            return first if first.outstanding <= second.outstanding else second
+        fewest = min(replica.outstanding for replica in candidates)
+        return random.choice([replica for replica in candidates if replica.outstanding == fewest])
+
+    async def _health_check_loop(self) -> None:
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            await asyncio.gather(*(self._check_replica(replica) for replica in self.replicas))
+
+    async def _check_replica(self, replica: Replica) -> None:
+        try:
+            response = await self.client.get(replica.url + HEALTH_CHECK_PATH, timeout=HEALTH_CHECK_TIMEOUT)
+            passed = response.status_code < 500
+        except httpx.HTTPError:
+            passed = False
+        replica.record_check(passed)
+
+    def hedge_delay(self, route: str) -> Optional[float]:
+        window = self.latencies.get(route)
+        p95 = None if window is None else window.p95()
+        return None if p95 is None else max(p95, UPSTREAM_HEDGE_MIN_DELAY)
+
+    def _check_breaker(self) -> None:
+        if not self.breaker.allow():
+            raise UpstreamUnavailable(self.name, self.breaker.retry_after())
+
+    def _record(self, response: httpx.Response, elapsed: float, method: str, route: str) -> None:
+        success = response.status_code < 500
+        if not success and is_backpressure(response):
+            # A service shedding load (e.g. a full executor queue) is healthy and answering:
+            # counting that as a failure would open the breaker for all of its routes
+            self.backpressure += 1
+            self.breaker.record(True)
+            return
+        self.breaker.record(success)
+        # Only GETs are hedged, and each route against its own latency: a slow TTS POST
+        # must not delay hedging a cheap database read
+        if success and method.upper() == "GET":
+            window = self.latencies.get(route)
+            if window is None and len(self.latencies) < LATENCY_ROUTES:
+                window = self.latencies[route] = LatencyWindow()
+            if window is not None:
+                window.add(elapsed)
+
+    async def stream(self, method: str, path: str, route: Optional[str] = None, **kwargs: Any) -> httpx.Response:
+        """Send a request and return once the headers arrive, leaving the body unread.
+
+        The caller owns the response and must ``aclose()`` it after consuming the body.
+        GETs are hedged like :meth:`request`, racing for the response headers.
+        """
+        if self.client is None:
+            raise RuntimeError(f"Upstream '{self.name}' used before the application started")
+        self.requests += 1
+        route = route or path
+        replica = self._choose_replica()
+        # Build before admitting the call: a malformed URL must not leave a half-open
+        # breaker with its trial slot taken and nothing to release it
+        request = self.client.build_request(method, replica.url + path, **kwargs)
+        self._check_breaker()
+        start = time.perf_counter()
+
+        def attempt(target: Replica) -> Awaitable[httpx.Response]:
+            if target is not replica:
+                return self._attempt_stream(target, self.client.build_request(method, target.url + path, **kwargs))
+            return self._attempt_stream(target, request)
+
+        try:
+            with track_dependency(METRICS_SERVICE, self.name, method.upper()):
+                if self._hedges(method):
+                    response = await self._hedged(route, replica, attempt)
+                else:
+                    response = await attempt(replica)
+        except httpx.TransportError:
+            self.breaker.record(False)
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self._record(response, time.perf_counter() - start, method, route)
+        return response
+
+    async def get(self, path: str, coalesce: bool = True, **kwargs: Any) -> httpx.Response:
+        return await self.request("GET", path, coalesce=coalesce, **kwargs)
+
+    async def post(self, path: str, coalesce: bool = False, **kwargs: Any) -> httpx.Response:
+        return await self.request("POST", path, coalesce=coalesce, **kwargs)
+
+    @staticmethod
+    def _coalesce_key(method: str, path: str, kwargs: Dict[str, Any]) -> tuple:
+        params = kwargs.get("params")
+        body = kwargs.get("content")
+        if body is None and kwargs.get("json") is not None:
+            body = json.dumps(kwargs["json"], sort_keys=True, separators=(",", ":"))
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        body_hash = hashlib.blake2b(body, digest_size=16).hexdigest() if body else None
+        return (
+            method.upper(),
+            path,
+            tuple(sorted(params.items())) if isinstance(params, dict) else params,
+            body_hash,
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "replicas": [replica.stats() for replica in self.replicas],
+            "in_process": self.app is not None,
+            "requests": self.requests,
+            "coalesced": self.coalesced,
+            "in_flight_coalesced": len(self._inflight),
+            "timeout": self.timeout,
+            "p95_latency_ms": {
+                route: round(p95 * 1000, 2)
+                for route, p95 in ((route, window.p95()) for route, window in self.latencies.items())
+                if p95 is not None
+            },
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "backpressure": self.backpressure,
+            "circuit_breaker": self.breaker.stats(),
+        }
@@ -0,0 +1,113 @@
+"""Microbenchmark of response serialization per endpoint: stock FastAPI vs. FAST_JSON.
+
+Loads the services with the same stubbed MongoDB and Google clients as load_test.py,
+calls each endpoint handler once to get a representative result, and then times only
+the step that turns that result into response bytes:
+
+- default: ``response_model`` re-validation and ``jsonable_encoder`` in
+  ``fastapi.routing.serialize_response`` followed by ``JSONResponse`` rendering,
+- fast: ``fastjson.respond`` (pydantic-core ``dump_json``, no re-validation).
+
+Usage:
+    python benchmark_json.py [iterations]
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+os.environ["FAST_JSON"] = "true"
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from starlette.requests import Request
+
+from load_test import load_stack
+
+
+# Handlers read the Accept header to pick the wire format; benchmark the JSON answer
+JSON_REQUEST = Request({"type": "http", "headers": [(b"accept", b"application/json")]})
+
+
+def find_route(app, method, path):
+    for route in app.routes:
+        if getattr(route, "path", None) == path and method in getattr(route, "methods", ()):
+            return route
+    raise LookupError(f"{method} {path}")
+
+
+async def representative_results(modules):
+    """(label, route, handler result) for every endpoint with a response_model."""
+    translation, map_service, packing = modules["translation"], modules["map"], modules["packing"]
+    phrases = await translation.phrases_collection.find().to_list(length=1)
+    phrase_id = str(phrases[0]["_id"])
+    category = phrases[0]["category"]
+
+    # Handlers return a Response when the fast path is on; switch it off to get the models
+    translation.fastjson.FAST_JSON = False
+    try:
+        cases = [
+            ("translation GET /common-phrases", translation.app, "GET", "/common-phrases",
+             await translation.get_common_phrases(JSON_REQUEST, limit=50, skip=0)),
+            ("translation GET /common-phrases/by-category", translation.app, "GET",
+             "/common-phrases/by-category/{category}", await translation.get_phrases_by_category(category, JSON_REQUEST)),
+            ("translation GET /common-phrases/{id}", translation.app, "GET", "/common-phrases/{phrase_id}",
+             await translation.get_phrase_by_id(phrase_id, JSON_REQUEST)),
+            ("translation POST /translate/text", translation.app, "POST", "/translate/text",
+             await translation.translate_text_endpoint(translation.TranslationRequest(
+                 text="Where is the train station?", source_language="en", target_language="ja-JP"), JSON_REQUEST)),
+            ("map GET /places", map_service.app, "GET", "/places",
+             await map_service.get_places(JSON_REQUEST, location="paris")),
+            ("map GET /directions", map_service.app, "GET", "/directions",
+             await map_service.get_directions_endpoint(JSON_REQUEST, origin="Louvre", destination="Eiffel Tower")),
+            ("packing POST /generate", packing.app, "POST", "/generate",
+             await packing.generate_packing_list_endpoint(packing.PackingListRequest(
+                 destination="Tokyo", duration=10, season="rainy", trip_type="business",
+                 activities=["meetings", "presentation"]), JSON_REQUEST)),
+        ]
+    finally:
+        translation.fastjson.FAST_JSON = True
+    return [(label, find_route(app, method, path), result) for label, app, method, path, result in cases]
+
+
+async def time_default(route, result, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        content = await serialize_response(field=route.response_field, response_content=result)
+        body = JSONResponse(content).body
+    return (time.perf_counter() - start) / iterations, body
+
+
+def time_fast(fastjson, route, result, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        body = fastjson.respond(result, route.response_model).body
+    return (time.perf_counter() - start) / iterations, body
+
+
+async def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    load_stack(SimpleNamespace(google_latency=0.0, mongo_latency=0.0))
+    modules = {
+        "translation": sys.modules["translation_main"],
+        "map": sys.modules["map_main"],
+        "packing": sys.modules["packing_main"],
+    }
+    fastjson = modules["translation"].fastjson
+
+    print(f"{'endpoint':<46}{'bytes':>8}{'default us':>12}{'fast us':>10}{'speedup':>9}")
+    for label, route, result in await representative_results(modules):
+        default, default_body = await time_default(route, result, iterations)
+        fast, fast_body = time_fast(fastjson, route, result, iterations)
+        # Both paths must produce the same document, only faster
+        mismatch = "" if json.loads(default_body) == json.loads(fast_body) else "  (output differs!)"
+        print(
+            f"{label:<46}{len(fast_body):>8}{default * 1e6:>12.1f}{fast * 1e6:>10.1f}"
+            f"{default / fast:>8.1f}x{mismatch}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,351 @@
+"""Reproducible load benchmark for the whole Travel Assistant stack.
+
+Boots the API gateway and the translation, map and packing services in this process
+(each on its own local port, all on one event loop), with MongoDB replaced by an
+in-memory collection loaded from the seed data and the Google Translate/TTS clients
+replaced by fakes with a configurable latency. Virtual users then log in and drive a
+mixed workload through the gateway, and throughput plus latency percentiles are
+reported per route.
+
+With ``--monolith`` the services are not given ports of their own; the gateway calls
+them in-process as in ``monolith.py``, so the two deployments can be compared.
+
+Usage:
+    python load_test.py --requests 5000 --concurrency 50 [--monolith]
+"""
+import argparse
+import asyncio
+import importlib.util
+import os
+import random
+import socket
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+import uvicorn
+from bson import ObjectId
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Weighted traffic mix: (label, weight)
+TRAFFIC_MIX = [
+    ("POST /token", 5),
+    ("POST /translate/text", 30),
+    ("POST /translate/tts", 10),
+    ("GET /translate/languages", 5),
+    ("GET /translate/common-phrases", 10),
+    ("GET /translate/common-phrases/by-category", 5),
+    ("GET /map/places", 20),
+    ("POST /packing/generate", 15),
+]
+
+TARGET_LANGUAGES = ["es-ES", "fr-FR", "de-DE", "it-IT", "ja-JP", "ko-KR", "ru-RU", "hi-IN"]
+SEASONS = ["summer", "winter", "spring", "fall", "rainy"]
+TRIP_TYPES = ["leisure", "business", "beach", "adventure"]
+ACTIVITIES = ["sightseeing", "dining", "hiking", "swimming", "meetings", "skiing"]
+
+
+# Stand-ins for MongoDB
+class StubCursor:
+    def __init__(self, documents, latency):
+        self._documents = documents
+        self._latency = latency
+
+    def skip(self, count):
+        return StubCursor(self._documents[count:], self._latency)
+
+    def limit(self, count):
+        return StubCursor(self._documents[:count] if count else self._documents, self._latency)
+
+    async def to_list(self, length=None):
+        await asyncio.sleep(self._latency)
+        documents = self._documents if length is None else self._documents[:length]
+        return [dict(document) for document in documents]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in await self.to_list():
+            yield document
+
+
+class StubCollection:
+    """Just enough of an AsyncIOMotorCollection for the services' equality queries."""
+
+    def __init__(self, documents, latency):
+        self._documents = documents
+        self._latency = latency
+
+    def _matching(self, query):
+        query = query or {}
+        return [
+            document for document in self._documents
+            if all(document.get(field) == value for field, value in query.items())
+        ]
+
+    def find(self, query=None, *args, **kwargs):
+        return StubCursor(self._matching(query), self._latency)
+
+    async def find_one(self, query=None, *args, **kwargs):
+        await asyncio.sleep(self._latency)
+        matches = self._matching(query)
+        return dict(matches[0]) if matches else None
+
+    async def distinct(self, field, *args, **kwargs):
+        await asyncio.sleep(self._latency)
+        values = []
+        for document in self._documents:
+            if field in document and document[field] not in values:
+                values.append(document[field])
+        return values
+
+    async def count_documents(self, query=None, *args, **kwargs):
+        return len(self._matching(query))
+
+
+# Stand-ins for the Google Cloud clients (synchronous, like the real ones)
+class FakeTranslateClient:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def translate(self, values, target_language=None, source_language=None, **kwargs):
+        time.sleep(self.latency)
+        texts = [values] if isinstance(values, str) else list(values)
+        results = [
+            {"translatedText": f"[{target_language}] {text}", "input": text}
+            for text in texts
+        ]
+        return results[0] if isinstance(values, str) else results
+
+
+class FakeSynthesizeResponse:
+    def __init__(self, audio_content):
+        self.audio_content = audio_content
+
+
+class FakeTTSClient:
+    def __init__(self, latency):
+        self.latency = latency
+
+    def synthesize_speech(self, input=None, voice=None, audio_config=None, **kwargs):
+        time.sleep(self.latency)
+        # Roughly the size of a short MP3 phrase
+        return FakeSynthesizeResponse(os.urandom(24 * 1024))
+
+
+def load_module(name, directory, filename="main.py"):
+    """Import a service file under a unique module name, with its folder importable."""
+    path = os.path.join(BASE_DIR, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(path, filename))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def load_stack(args):
+    """Import the four apps with stubbed backends and return them with their ports."""
+    ports = {name: free_port() for name in ("gateway", "translation", "map", "packing")}
+    # Never reach a real database or Google project from the benchmark
+    os.environ["MONGO_URI"] = "mongodb://localhost:27017"
+    os.environ["TRANSLATION_SERVICE_URL"] = f"http://127.0.0.1:{ports['translation']}"
+    os.environ["MAP_SERVICE_URL"] = f"http://127.0.0.1:{ports['map']}"
+    os.environ["PACKING_SERVICE_URL"] = f"http://127.0.0.1:{ports['packing']}"
+    # All virtual users share one account and all apps share one event loop, so the
+    # gateway's per-user limits and lag-based shedding are off unless set explicitly
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    os.environ.setdefault("GATEWAY_MAX_EVENT_LOOP_LAG", "0")
+    # Keep runs reproducible: no translations carried over on disk from an earlier run
+    os.environ.setdefault("TRANSLATION_CACHE_DB", "")
+
+    from google.cloud import texttospeech
+    from google.cloud import translate_v2
+
+    texttospeech.TextToSpeechClient.from_service_account_json = staticmethod(
+        lambda *a, **k: FakeTTSClient(args.google_latency)
+    )
+    translate_v2.Client.from_service_account_json = staticmethod(
+        lambda *a, **k: FakeTranslateClient(args.google_latency)
+    )
+
+    phrase_seed = load_module("translation_seed_data", "translation_service", "seed_data.py")
+    places_seed = load_module("map_seed_data", "map_service", "seed_data.py")
+
+    phrases = [dict(phrase, _id=ObjectId()) for phrase in phrase_seed.sample_phrases]
+    places = [
+        dict(place, _id=str(ObjectId()), location=location)
+        for location, location_places in places_seed.sample_places.items()
+        for place in location_places
+    ]
+
+    translation = load_module("translation_main", "translation_service")
+    translation.phrases_collection = StubCollection(phrases, args.mongo_latency)
+    map_service = load_module("map_main", "map_service")
+    map_service.places_collection = StubCollection(places, args.mongo_latency)
+    packing = load_module("packing_main", "packing_service")
+    gateway = load_module("gateway_main", "api_gateway")
+
+    apps = {
+        "gateway": gateway.app,
+        "translation": translation.app,
+        "map": map_service.app,
+        "packing": packing.app,
+    }
+    workload = {
+        "phrases": [phrase["phrase"] for phrase in phrases],
+        # Categories containing "/" cannot be addressed as a path parameter
+        "categories": sorted({phrase["category"] for phrase in phrases if "/" not in phrase["category"]}),
+        "locations": list(places_seed.sample_places.keys()),
+    }
+    return apps, ports, workload
+
+
+def build_request(label, workload):
+    """Return (method, path, kwargs) for one request of the given mix label."""
+    if label == "POST /translate/text":
+        return "POST", "/translate/text", {"json": {
+            "text": random.choice(workload["phrases"]),
+            "source_language": "en",
+            "target_language": random.choice(TARGET_LANGUAGES),
+        }}
+    if label == "POST /translate/tts":
+        language = random.choice(TARGET_LANGUAGES)
+        return "POST", "/translate/tts", {"json": {
+            "text": random.choice(workload["phrases"]),
+            "language_code": language,
+        }}
+    if label == "GET /translate/languages":
+        return "GET", "/translate/languages", {}
+    if label == "GET /translate/common-phrases":
+        return "GET", "/translate/common-phrases", {"params": {"limit": 50, "skip": 0}}
+    if label == "GET /translate/common-phrases/by-category":
+        category = random.choice(workload["categories"])
+        return "GET", f"/translate/common-phrases/by-category/{category}", {}
+    if label == "GET /map/places":
+        return "GET", "/map/places", {"params": {"location": random.choice(workload["locations"])}}
+    if label == "POST /packing/generate":
+        return "POST", "/packing/generate", {"json": {
+            "destination": random.choice(workload["locations"]).title(),
+            "duration": random.randint(1, 21),
+            "season": random.choice(SEASONS),
+            "trip_type": random.choice(TRIP_TYPES),
+            "activities": random.sample(ACTIVITIES, 2),
+        }}
+    raise ValueError(f"Unknown traffic label: {label}")
+
+
+async def login(client):
+    response = await client.post("/token", data={"username": "testuser", "password": "testpassword"})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+
+async def virtual_user(client, workload, remaining, results):
+    labels = [label for label, _ in TRAFFIC_MIX]
+    weights = [weight for _, weight in TRAFFIC_MIX]
+    headers = await login(client)
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        label = random.choices(labels, weights)[0]
+        start = time.perf_counter()
+        try:
+            if label == "POST /token":
+                headers = await login(client)
+                ok = True
+            else:
+                method, path, kwargs = build_request(label, workload)
+                response = await client.request(method, path, headers=headers, **kwargs)
+                ok = response.status_code < 400
+        except httpx.HTTPError:
+            ok = False
+        results[label].append(((time.perf_counter() - start) * 1000, ok))
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def report(results, elapsed):
+    total = sum(len(samples) for samples in results.values())
+    print(f"\n{total} requests in {elapsed:.2f} s ({total / elapsed:.1f} req/s)\n")
+    print(f"{'route':<44}{'count':>7}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for label, _ in TRAFFIC_MIX:
+        samples = results.get(label)
+        if not samples:
+            continue
+        latencies = [latency for latency, _ in samples]
+        errors = sum(1 for _, ok in samples if not ok)
+        print(
+            f"{label:<44}{len(samples):>7}{errors:>8}{len(samples) / elapsed:>9.1f}"
+            f"{percentile(latencies, 50):>9.2f}{percentile(latencies, 95):>9.2f}"
+            f"{percentile(latencies, 99):>9.2f}{max(latencies):>9.2f}"
+        )
+    all_latencies = [latency for samples in results.values() for latency, _ in samples]
+    print(f"\nOverall mean latency: {statistics.mean(all_latencies):.2f} ms")
+
+
+async def main(args):
+    random.seed(args.seed)
+    apps, ports, workload = load_stack(args)
+    if args.monolith:
+        from monolith import create_app
+
+        services = {name: apps.pop(name) for name in ("translation", "map", "packing")}
+        apps["gateway"] = create_app(sys.modules["gateway_main"], services)
+
+    servers = []
+    for name, app in apps.items():
+        config = uvicorn.Config(app, host="127.0.0.1", port=ports[name], log_level="warning")
+        server = uvicorn.Server(config)
+        servers.append((server, asyncio.ensure_future(server.serve())))
+    while not all(server.started for server, _ in servers):
+        await asyncio.sleep(0.05)
+
+    print(
+        f"Stack up (gateway on {ports['gateway']}): {args.requests} requests, "
+        f"concurrency {args.concurrency}, Google latency {args.google_latency * 1000:.0f} ms, "
+        f"MongoDB latency {args.mongo_latency * 1000:.0f} ms"
+        f"{', monolith' if args.monolith else ''}"
+    )
+
+    results = defaultdict(list)
+    remaining = [args.requests]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{ports['gateway']}", limits=limits, timeout=60
+    ) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            virtual_user(client, workload, remaining, results) for _ in range(args.concurrency)
+        ))
+        elapsed = time.perf_counter() - start
+
+    report(results, elapsed)
+
+    for server, _ in servers:
+        server.should_exit = True
+    await asyncio.gather(*(task for _, task in servers))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load benchmark for the Travel Assistant stack")
+    parser.add_argument("--requests", type=int, default=3000, help="total requests to send")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent virtual users")
+    parser.add_argument("--google-latency", type=float, default=0.05, help="fake Google API latency (s)")
+    parser.add_argument("--mongo-latency", type=float, default=0.002, help="stub MongoDB latency (s)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for the traffic mix")
+    parser.add_argument("--monolith", action="store_true", help="call the services in-process from the gateway")
+    asyncio.run(main(parser.parse_args()))
@@ -1,15 +1,22 @@
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Dict, Optional, Any, Annotated
 import os
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 from bson import ObjectId
+import fastjson
+import instrumentation
+import wire
+from instrumentation import track_dependency
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Map Service")
+SERVICE_NAME = "map_service"
+
+app = FastAPI(title="Map Service", default_response_class=fastjson.response_class())
+instrumentation.install(app, SERVICE_NAME)
 
 # MongoDB connection
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
@@ -95,11 +102,12 @@ async def root():
 @app.get("/locations")
 async def get_available_locations():
     """Get all available locations in the database"""
-    locations = await places_collection.distinct("location")
+    with track_dependency(SERVICE_NAME, "mongodb", "distinct"):
+        locations = await places_collection.distinct("location")
     return {"locations": locations}
 
 @app.get("/places", response_model=List[Place])
-async def get_places(location: str = Query(..., description="City or location name")):
+async def get_places(http_request: Request, location: str = Query(..., description="City or location name")):
     """Get all places for a specific location"""
     location_lower = location.lower()
     
@@ -107,21 +115,24 @@ async def get_places(location: str = Query(..., description="City or location na
     places = []
     cursor = places_collection.find({"location": location_lower})
     
-    async for document in cursor:
+    with track_dependency(SERVICE_NAME, "mongodb", "find"):
+        documents = await cursor.to_list(length=None)
+    for document in documents:
         places.append(Place.model_validate(document))
     
     if not places:
         raise HTTPException(status_code=404, detail=f"No places found for: {location}")
     
-    return places
+    return wire.respond(http_request, places, List[Place])
 
 @app.get("/directions", response_model=Direction)
 async def get_directions_endpoint(
+    http_request: Request,
     origin: str = Query(..., description="Origin location"),
     destination: str = Query(..., description="Destination location")
 ):
     # Here, in a real implementation, you would call a mapping API
-    return get_mock_directions(origin, destination)
+    return wire.respond(http_request, get_mock_directions(origin, destination), Direction)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,92 @@
+"""Monolith mode: the API gateway and the three services in one process.
+
+For small deployments the gateway serves the public API as usual, but its upstream
+calls go straight into the translation, map and packing apps through
+``httpx.ASGITransport`` instead of over the network, so there are no sockets, no
+connection pools and no extra hops. With ``MONOLITH_MOUNT_SERVICES=true`` the
+services are also mounted under ``/services/<name>`` (e.g. ``/services/map/places``);
+those routes bypass the gateway's auth, rate limits and admission control, so the
+mount is off by default. The split deployment is unchanged.
+
+Run from this folder:
+
+    python monolith.py
+    uvicorn monolith:create_app --factory --port 8000
+"""
+import importlib.util
+import os
+import sys
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Dict, Optional
+
+from starlette.applications import Starlette
+from starlette.routing import Mount
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PORT = int(os.getenv("SERVICE_PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+MONOLITH_MOUNT_SERVICES = os.getenv("MONOLITH_MOUNT_SERVICES", "false").lower() == "true"
+
+# Upstream name in the gateway -> service folder
+SERVICES = {
+    "translation": "translation_service",
+    "map": "map_service",
+    "packing": "packing_service",
+}
+
+
+def load_module(name: str, directory: str):
+    """Import ``<directory>/main.py`` under a unique module name, with its folder importable."""
+    path = os.path.join(BASE_DIR, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+    spec = importlib.util.spec_from_file_location(name, os.path.join(path, "main.py"))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_app(gateway=None, services: Optional[Dict[str, object]] = None) -> Starlette:
+    """Wire the gateway module to in-process service apps and return the combined app.
+
+    Without arguments the four apps are imported from their folders; tools that have
+    already imported them (e.g. ``load_test.py``) pass the gateway module and the
+    service apps keyed by upstream name.
+    """
+    if services is None:
+        services = {name: load_module(f"{directory}_main", directory).app for name, directory in SERVICES.items()}
+    if gateway is None:
+        gateway = load_module("api_gateway_main", "api_gateway")
+
+    for upstream in gateway.UPSTREAMS:
+        upstream.use_asgi_app(services[upstream.name])
+
+    @asynccontextmanager
+    async def lifespan(app):
+        # Mounted apps do not get lifespan events; run the services' first so they are
+        # ready before the gateway opens its upstreams, and stop them after it
+        async with AsyncExitStack() as stack:
+            for service_app in services.values():
+                await stack.enter_async_context(service_app.router.lifespan_context(service_app))
+            await stack.enter_async_context(gateway.app.router.lifespan_context(gateway.app))
+            yield
+
+    routes = []
+    if MONOLITH_MOUNT_SERVICES:
+        routes += [Mount(f"/services/{name}", app=service_app) for name, service_app in services.items()]
+    routes.append(Mount("/", app=gateway.app))
+    return Starlette(routes=routes, lifespan=lifespan)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(
+        "monolith:create_app",
+        factory=True,
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        app_dir=BASE_DIR,
+    )
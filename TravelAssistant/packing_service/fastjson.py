@@ -0,0 +1,61 @@
+"""Opt-in fast JSON responses shared by the Travel Assistant services.
+
+Each service is built from its own directory, so this module is kept as an identical
+copy in every service folder. With ``FAST_JSON=true``:
+
+- ``response_class()`` returns an orjson-based response class to use as the app's
+  ``default_response_class`` (plain dict/list results are encoded by orjson),
+- ``respond(value, annotation)`` serializes models the handler built itself straight
+  to JSON bytes with pydantic-core and returns a ``Response``, so FastAPI skips
+  re-validating them against the route's ``response_model``.
+
+When the flag is off (the default) or orjson is not installed, both fall back to the
+stock FastAPI behaviour.
+"""
+import os
+from typing import Any, Dict
+
+from pydantic import TypeAdapter
+from starlette.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+FAST_JSON = os.getenv("FAST_JSON", "false").lower() == "true"
+
+# TypeAdapters are expensive to build; keep one per response annotation
+_adapters: Dict[Any, TypeAdapter] = {}
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+
+
+def response_class():
+    """Response class to pass as ``FastAPI(default_response_class=...)``."""
+    return ORJSONResponse if FAST_JSON and orjson is not None else JSONResponse
+
+
+def respond(value: Any, annotation: Any, status_code: int = 200) -> Any:
+    """Serialize ``value`` as ``annotation`` (the route's response_model) when enabled.
+
+    Returns ``value`` unchanged when the fast path is off, so the route behaves exactly
+    as before. Aliases are used, matching FastAPI's ``response_model_by_alias``.
+    """
+    if not FAST_JSON:
+        return value
+    return Response(
+        type_adapter(annotation).dump_json(value, by_alias=True),
+        status_code=status_code,
+        media_type="application/json",
+    )
+
+
+def type_adapter(annotation: Any) -> TypeAdapter:
+    adapter = _adapters.get(annotation)
+    if adapter is None:
+        adapter = _adapters[annotation] = TypeAdapter(annotation)
+    return adapter
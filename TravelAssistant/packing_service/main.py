@@ -1,9 +1,13 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 import os
+import fastjson
+import instrumentation
+import wire
 
-app = FastAPI(title="Packing List Service")
+app = FastAPI(title="Packing List Service", default_response_class=fastjson.response_class())
+instrumentation.install(app, "packing_service")
 
 # Get port from environment
 PORT = int(os.getenv("SERVICE_PORT", "8003"))
@@ -497,16 +501,16 @@ async def root():
     }
 
 @app.post("/generate", response_model=PackingListResponse)
-async def generate_packing_list_endpoint(request: PackingListRequest):
+async def generate_packing_list_endpoint(request: PackingListRequest, http_request: Request):
     items = generate_packing_list(request)
     
-    return PackingListResponse(
+    return wire.respond(http_request, PackingListResponse(
         items=items,
         destination=request.destination,
         duration=request.duration,
         season=request.season,
         trip_type=request.trip_type
-    )
+    ), PackingListResponse)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,66 @@
+"""Checks for the gateway's refresh-token rotation.
+
+Runs in-process against the stubbed stack from load_test.py (no MongoDB, Google
+project or running servers needed):
+
+    python -m pytest test_gateway_auth.py
+    python test_gateway_auth.py
+"""
+import asyncio
+
+import httpx
+
+from test_gateway_batch import gateway_stack
+
+
+async def run_auth(steps):
+    """Log in, then call ``steps(client, tokens)`` against the in-process gateway."""
+    app = gateway_stack()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            response = await client.post("/token", data={"username": "testuser", "password": "testpassword"})
+            assert response.status_code == 200, response.text
+            return await steps(client, response.json())
+
+
+async def refresh(client, refresh_token):
+    return await client.post("/token/refresh", json={"refresh_token": refresh_token})
+
+
+def test_refresh_issues_a_working_pair():
+    async def steps(client, tokens):
+        response = await refresh(client, tokens["refresh_token"])
+        assert response.status_code == 200, response.text
+        rotated = response.json()
+        assert rotated["refresh_token"] != tokens["refresh_token"]
+        me = await client.get("/users/me", headers={"Authorization": f"Bearer {rotated['access_token']}"})
+        assert me.status_code == 200
+        assert me.json()["username"] == "testuser"
+
+    asyncio.run(run_auth(steps))
+
+
+def test_replayed_refresh_token_ends_the_session():
+    async def steps(client, tokens):
+        newest = (await refresh(client, tokens["refresh_token"])).json()["refresh_token"]
+        # The exchanged token is refused, and replaying it revokes the newest one too
+        assert (await refresh(client, tokens["refresh_token"])).status_code == 401
+        assert (await refresh(client, newest)).status_code == 401
+
+    asyncio.run(run_auth(steps))
+
+
+def test_refresh_token_is_not_a_bearer_token():
+    async def steps(client, tokens):
+        response = await client.get("/users/me", headers={"Authorization": f"Bearer {tokens['refresh_token']}"})
+        assert response.status_code == 401
+
+    asyncio.run(run_auth(steps))
+
+
+if __name__ == "__main__":
+    test_refresh_issues_a_working_pair()
+    test_replayed_refresh_token_ends_the_session()
+    test_refresh_token_is_not_a_bearer_token()
+    print("All auth checks passed")
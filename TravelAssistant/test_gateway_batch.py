@@ -0,0 +1,97 @@
+"""Checks for the gateway's POST /batch endpoint.
+
+Runs in-process against the stubbed stack from load_test.py (no MongoDB, Google
+project or running servers needed):
+
+    python -m pytest test_gateway_batch.py
+    python test_gateway_batch.py
+"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+
+import load_test
+import monolith
+
+_stack = {}
+
+
+def gateway_stack():
+    """Load the four apps once and wire the gateway to the services in-process."""
+    if not _stack:
+        apps, _, _ = load_test.load_stack(SimpleNamespace(google_latency=0.0, mongo_latency=0.0))
+        services = {name: apps[name] for name in ("translation", "map", "packing")}
+        _stack["app"] = monolith.create_app(load_test.sys.modules["gateway_main"], services)
+    return _stack["app"]
+
+
+async def run_batch(sub_requests):
+    app = gateway_stack()
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://gateway") as client:
+            token = (await client.post(
+                "/token", data={"username": "testuser", "password": "testpassword"}
+            )).json()["access_token"]
+            response = await client.post(
+                "/batch", json={"requests": sub_requests}, headers={"Authorization": f"Bearer {token}"}
+            )
+    assert response.status_code == 200, response.text
+    return response.json()["responses"]
+
+
+def test_batch_runs_allowed_routes():
+    responses = asyncio.run(run_batch([
+        {"method": "GET", "path": "/translate/languages"},
+        {"method": "GET", "path": "/map/places", "params": {"location": "Tokyo"}},
+    ]))
+    assert [response["status"] for response in responses] == [200, 200]
+
+
+def test_full_batch_is_charged_once():
+    # 50 sub-requests exceed the default per-route burst and a tight in-flight limit
+    gateway_stack()
+    gateway = load_test.sys.modules["gateway_main"]
+    limits = gateway.RATE_LIMIT_ENABLED, gateway.admission_control.max_in_flight
+    gateway.RATE_LIMIT_ENABLED, gateway.admission_control.max_in_flight = True, 5
+    try:
+        responses = asyncio.run(run_batch(
+            [{"method": "GET", "path": "/translate/common-phrases", "params": {"limit": 1, "skip": skip}}
+             for skip in range(gateway.BATCH_MAX_REQUESTS)]
+        ))
+    finally:
+        gateway.RATE_LIMIT_ENABLED, gateway.admission_control.max_in_flight = limits
+    assert [response["status"] for response in responses] == [200] * gateway.BATCH_MAX_REQUESTS
+
+
+def test_batch_rejects_path_traversal():
+    paths = [
+        "/translate/../admin/stats",
+        "/map/../users/me",
+        "/translate/../batch",
+        "/translate/./../admin/stats",
+        "/translate/%2e%2e/admin/stats",
+        "/translate//languages",
+        "/admin/stats",
+        "/batch",
+        "/translate/languages?x=1",
+    ]
+    responses = asyncio.run(run_batch([{"method": "GET", "path": path} for path in paths]))
+    assert [response["status"] for response in responses] == [400] * len(paths)
+    for response in responses:
+        assert "Route not allowed in batch" in response["body"]["detail"]
+
+
+def test_batch_rejects_wrong_method():
+    responses = asyncio.run(run_batch([{"method": "DELETE", "path": "/admin/translation-cache"},
+                                       {"method": "POST", "path": "/translate/languages"}]))
+    assert [response["status"] for response in responses] == [400, 400]
+
+
+if __name__ == "__main__":
+    test_batch_runs_allowed_routes()
+    test_full_batch_is_charged_once()
+    test_batch_rejects_path_traversal()
+    test_batch_rejects_wrong_method()
+    print("All batch checks passed")
@@ -0,0 +1,99 @@
+"""Checks for the gateway's upstream clients: in-process timeouts and hedged GETs.
+
+    python -m pytest test_gateway_upstream.py
+    python test_gateway_upstream.py
+"""
+import asyncio
+
+import httpx
+
+import load_test
+from test_gateway_batch import gateway_stack
+
+
+async def slow_app(scope, receive, send):
+    """An ASGI service that answers long after any reasonable timeout."""
+    if scope["type"] != "http":
+        return
+    await asyncio.sleep(2)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"{}"})
+
+
+async def call_slow_upstream(stream):
+    gateway_stack()
+    upstream = load_test.sys.modules["gateway_main"].Upstream("slow", "http://unused", timeout=0.2)
+    upstream.use_asgi_app(slow_app)
+    upstream.open()
+    start = asyncio.get_running_loop().time()
+    try:
+        if stream:
+            await upstream.stream("GET", "/")
+        else:
+            await upstream.get("/")
+    except httpx.ReadTimeout:
+        elapsed = asyncio.get_running_loop().time() - start
+    else:
+        raise AssertionError("in-process call outlived the upstream's timeout")
+    finally:
+        await upstream.aclose()
+    return elapsed, list(upstream.breaker.outcomes)
+
+
+def test_in_process_request_keeps_timeout():
+    elapsed, outcomes = asyncio.run(call_slow_upstream(stream=False))
+    assert elapsed < 1
+    assert outcomes == [False]
+
+
+def test_in_process_stream_keeps_timeout():
+    elapsed, outcomes = asyncio.run(call_slow_upstream(stream=True))
+    assert elapsed < 1
+    assert outcomes == [False]
+
+
+async def hedge_slow_stream():
+    gateway_stack()
+    gateway = load_test.sys.modules["gateway_main"]
+    upstream_module = load_test.sys.modules["upstream"]
+    # Set to the number of attempts to delay
+    slow = []
+
+    async def handler(request):
+        if slow:
+            slow.pop()
+            await asyncio.sleep(2)
+        return httpx.Response(200, json={"path": request.url.path})
+
+    upstream = gateway.Upstream("hedged", ["http://replica-a", "http://replica-b"], timeout=5)
+    upstream.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    # A fast history for the route, and a slow POST that must not raise its p95
+    for _ in range(upstream_module.HEDGE_MIN_SAMPLES):
+        await upstream.request("GET", "/slow", route="/{name}")
+    await upstream.request("POST", "/tts")
+    slow.append(True)
+
+    hedge, upstream_module.UPSTREAM_HEDGE = upstream_module.UPSTREAM_HEDGE, True
+    start = asyncio.get_running_loop().time()
+    try:
+        response = await upstream.stream("GET", "/slow", route="/{name}")
+        await response.aread()
+        await response.aclose()
+    finally:
+        upstream_module.UPSTREAM_HEDGE = hedge
+        await upstream.client.aclose()
+    return asyncio.get_running_loop().time() - start, upstream.stats()
+
+
+def test_streamed_get_is_hedged_per_route():
+    elapsed, stats = asyncio.run(hedge_slow_stream())
+    assert elapsed < 1
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+    assert list(stats["p95_latency_ms"]) == ["/{name}"]
+
+
+if __name__ == "__main__":
+    test_in_process_request_keeps_timeout()
+    test_in_process_stream_keeps_timeout()
+    test_streamed_get_is_hedged_per_route()
+    print("All upstream checks passed")
@@ -0,0 +1,113 @@
+"""Critical-path report for spans exported with ``TRACE_EXPORTER=file``.
+
+Reads one or more JSON-lines trace files (e.g. one per service, or a shared one),
+rebuilds each trace from its spans and prints:
+
+- the slowest traces as span trees, with the spans on the critical path marked ``*``,
+- how much critical-path time each service/operation accounts for over all traces.
+
+The critical path of a span follows, from its end backwards, the child that finished
+last before it, then the child that finished last before that child started, and so
+on; the time not covered by those children is the span's own (self) time.
+
+Usage:
+    python trace_report.py traces.jsonl [more.jsonl ...] [--slowest 5] [--route /translate/tts]
+"""
+import argparse
+import json
+from collections import defaultdict
+
+
+def load_spans(paths):
+    spans = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as trace_file:
+            for line in trace_file:
+                line = line.strip()
+                if line:
+                    span = json.loads(line)
+                    span["end"] = span["start"] + span["duration_ms"] / 1000
+                    spans[span["span_id"]] = span
+    return spans
+
+
+def build_traces(spans):
+    """Return {trace_id: root span}, with each span's children attached."""
+    for span in spans.values():
+        span["children"] = []
+    roots = {}
+    for span in spans.values():
+        parent = spans.get(span["parent_id"]) if span["parent_id"] else None
+        if parent is not None:
+            parent["children"].append(span)
+        else:
+            # Spans whose parent was not exported (e.g. a client outside the stack) are roots
+            current = roots.get(span["trace_id"])
+            if current is None or span["start"] < current["start"]:
+                roots[span["trace_id"]] = span
+    for span in spans.values():
+        span["children"].sort(key=lambda child: child["start"])
+    return roots
+
+
+def mark_critical_path(span, self_times):
+    """Mark the critical path below ``span`` and add each span's self time to ``self_times``."""
+    span["critical"] = True
+    cursor = span["end"]
+    covered = 0.0
+    for child in sorted(span["children"], key=lambda child: child["end"], reverse=True):
+        if child["end"] <= cursor + 1e-6:
+            mark_critical_path(child, self_times)
+            covered += min(child["end"], cursor) - max(child["start"], span["start"])
+            cursor = child["start"]
+            if cursor <= span["start"]:
+                break
+    self_ms = max(0.0, span["duration_ms"] - covered * 1000)
+    self_times[(span["service"], span["name"])] += self_ms
+
+
+def print_tree(span, origin, depth=0):
+    marker = "*" if span.get("critical") else " "
+    offset = (span["start"] - origin) * 1000
+    error = f"  ERROR {span['error']}" if span.get("error") else ""
+    print(
+        f"  {marker} {offset:8.1f} ms  {span['duration_ms']:8.1f} ms  "
+        f"{'  ' * depth}{span['service']}: {span['name']}{error}"
+    )
+    for child in span["children"]:
+        print_tree(child, origin, depth + 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+", help="JSON-lines files written by the file exporter")
+    parser.add_argument("--slowest", type=int, default=5, help="Traces to print as trees")
+    parser.add_argument("--route", help="Only traces whose root span name contains this text")
+    args = parser.parse_args()
+
+    roots = build_traces(load_spans(args.files))
+    traces = [root for root in roots.values() if not args.route or args.route in root["name"]]
+    if not traces:
+        print("No matching traces")
+        return
+
+    self_times = defaultdict(float)
+    for root in traces:
+        mark_critical_path(root, self_times)
+
+    traces.sort(key=lambda root: root["duration_ms"], reverse=True)
+    print(f"{len(traces)} traces\n")
+    for root in traces[:args.slowest]:
+        print(f"trace {root['trace_id']}  {root['duration_ms']:.1f} ms")
+        print_tree(root, root["start"])
+        print()
+
+    total = sum(self_times.values())
+    print("Critical-path time by span (self time, all traces)")
+    print(f"  {'service':<22}{'span':<44}{'total ms':>12}{'share':>8}")
+    for (service, name), self_ms in sorted(self_times.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {service:<22}{name:<44}{self_ms:>12.1f}{self_ms / total:>8.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Micro-batching of concurrent single calls into list calls.
+
+Under load many ``/translate/text`` requests for the same language pair arrive within a
+few milliseconds of each other. Instead of one Google Translate call each, a
+``MicroBatcher`` holds the items submitted for a key (e.g. ``(source, target)``) for up
+to ``window`` seconds, then makes one call with all of them on the executor and hands
+every caller its own result. A batch is sent early once it reaches ``max_items`` items
+or ``max_chars`` characters. Identical items in a batch are sent once.
+"""
+import asyncio
+from typing import Any, Callable, Dict, Hashable, List, Set, Tuple
+
+from prometheus_client import Histogram
+
+from executor import BoundedExecutor
+
+MICROBATCH_SIZE = Histogram(
+    "microbatch_size",
+    "Items per call made by a micro-batcher",
+    ["service", "batcher"],
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+
+Batch = List[Tuple[str, "asyncio.Future[Any]"]]
+
+
+class MicroBatcher:
+    def __init__(
+        self,
+        service: str,
+        name: str,
+        executor: BoundedExecutor,
+        fn: Callable[..., List[Any]],
+        window: float,
+        max_items: int,
+        max_chars: int,
+    ):
+        """``fn(items, *key)`` runs on ``executor`` and returns one result per item, in order."""
+        self.name = name
+        self.executor = executor
+        self.fn = fn
+        self.window = window
+        self.max_items = max_items
+        self.max_chars = max_chars
+        self._pending: Dict[Hashable, Batch] = {}
+        self._chars: Dict[Hashable, int] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        # Strong references to running batches so they are not garbage collected
+        self._tasks: Set["asyncio.Task[None]"] = set()
+        self.items = 0
+        self.calls = 0
+        self.max_batch = 0
+        self._size = MICROBATCH_SIZE.labels(service, name)
+
+    async def submit(self, key: Tuple[Any, ...], item: str) -> Any:
+        """Queue ``item`` for the next call for ``key`` and wait for its result."""
+        if self.window <= 0:
+            self._record(1)
+            return (await self.executor.run(self.fn, [item], *key))[0]
+
+        loop = asyncio.get_running_loop()
+        if key in self._pending and self._chars[key] + len(item) > self.max_chars:
+            self._flush(key)
+        batch = self._pending.setdefault(key, [])
+        if not batch:
+            self._chars[key] = 0
+            self._timers[key] = loop.call_later(self.window, self._flush, key)
+        future = loop.create_future()
+        batch.append((item, future))
+        self._chars[key] += len(item)
+        if len(batch) >= self.max_items:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key: Hashable) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        self._chars.pop(key, None)
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Tuple[Any, ...], batch: Batch) -> None:
+        items = list(dict.fromkeys(item for item, _ in batch))
+        self._record(len(items))
+        try:
+            results = await self.executor.run(self.fn, items, *key)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        by_item = dict(zip(items, results))
+        for item, future in batch:
+            # Callers that gave up (e.g. client disconnects) have cancelled their future
+            if not future.done():
+                future.set_result(by_item[item])
+
+    def _record(self, size: int) -> None:
+        self.items += size
+        self.calls += 1
+        self.max_batch = max(self.max_batch, size)
+        self._size.observe(size)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "window_ms": self.window * 1000,
+            "max_items": self.max_items,
+            "max_chars": self.max_chars,
+            "calls": self.calls,
+            "items": self.items,
+            "max_batch": self.max_batch,
+            "average_batch": round(self.items / self.calls, 2) if self.calls else 0.0,
+            "waiting": sum(len(batch) for batch in self._pending.values()),
+        }
@@ -0,0 +1,95 @@
+"""Bounded thread pools for the translation service's blocking Google client calls.
+
+The Google Translate and TTS clients are synchronous; calling them from a handler
+would stall the event loop (and every other request, including MongoDB reads) for the
+duration of the call. Each client gets its own pool so slow TTS synthesis cannot use
+up the capacity of translations, and a cap on queued calls so overload is answered
+with 503 + ``Retry-After`` instead of an ever-growing queue.
+"""
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+from prometheus_client import Counter, Gauge
+
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "executor_queue_depth",
+    "Blocking calls waiting for a worker thread",
+    ["service", "executor"],
+    multiprocess_mode="livesum",
+)
+EXECUTOR_IN_PROGRESS = Gauge(
+    "executor_in_progress",
+    "Blocking calls running on a worker thread",
+    ["service", "executor"],
+    multiprocess_mode="livesum",
+)
+EXECUTOR_REJECTED = Counter(
+    "executor_rejected_total",
+    "Blocking calls rejected because the executor queue was full",
+    ["service", "executor"],
+)
+
+
+class BoundedExecutor:
+    def __init__(self, service: str, name: str, workers: int, max_queue: int):
+        self.name = name
+        self.workers = workers
+        self.max_queue = max_queue
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_pid: Optional[int] = None
+        self.pending = 0
+        self.max_pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self._queue_depth = EXECUTOR_QUEUE_DEPTH.labels(service, name)
+        self._in_progress = EXECUTOR_IN_PROGRESS.labels(service, name)
+        self._rejected = EXECUTOR_REJECTED.labels(service, name)
+
+    # Worker threads do not survive fork(); each process starts its own pool lazily
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None or self._pool_pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+            self._pool_pid = os.getpid()
+        return self._pool
+
+    async def run(self, fn: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Run ``fn`` on a worker thread with the caller's context (e.g. the active span)."""
+        if self.pending >= self.workers + self.max_queue:
+            self.rejected += 1
+            self._rejected.inc()
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Too many concurrent {self.name} calls, please retry",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        self.max_pending = max(self.max_pending, self.pending)
+        self._update_gauges()
+        context = contextvars.copy_context()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor(), functools.partial(context.run, fn, *args, **kwargs))
+        finally:
+            self.pending -= 1
+            self.completed += 1
+            self._update_gauges()
+
+    def _update_gauges(self) -> None:
+        self._queue_depth.set(max(0, self.pending - self.workers))
+        self._in_progress.set(min(self.pending, self.workers))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "in_progress": min(self.pending, self.workers),
+            "queued": max(0, self.pending - self.workers),
+            "max_pending": self.max_pending,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
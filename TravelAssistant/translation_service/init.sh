@@ -10,4 +10,4 @@ python seed_data.py
 
 # Start the Translation Service
 echo "Starting the Translation Service..."
-uvicorn main:app --host 0.0.0.0 --port 8001 
\ No newline at end of file
+exec python serve.py 
\ No newline at end of file
@@ -1,6 +1,8 @@
-from fastapi import FastAPI, HTTPException, Query
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from pydantic import BaseModel, Field, ConfigDict, BeforeValidator
-from typing import List, Dict, Optional, Any, Annotated, cast
+from typing import List, Dict, Optional, Any, Annotated, Tuple, Union, cast
+import asyncio
 import os
 import base64
 from dotenv import load_dotenv
@@ -10,11 +12,27 @@ import json
 from google.cloud import texttospeech
 from google.cloud import storage
 from google.cloud import translate_v2 as translate
+import fastjson
+import instrumentation
+import wire
+from batcher import MicroBatcher
+from executor import BoundedExecutor
+from phrase_index import PhraseIndex
+from translation_cache import TranslationCache
+from instrumentation import track_dependency
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Translation Service")
+SERVICE_NAME = "translation_service"
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await load_phrase_index()
+    yield
+
+app = FastAPI(title="Translation Service", lifespan=lifespan, default_response_class=fastjson.response_class())
+instrumentation.install(app, SERVICE_NAME)
 
 # MongoDB connection
 MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
@@ -39,6 +57,13 @@ def convert_object_id(id: Any) -> str:
 # Use Annotated with BeforeValidator for ObjectId
 PyObjectId = Annotated[str, BeforeValidator(convert_object_id)]
 
+# Limits for POST /translate/batch
+TRANSLATE_BATCH_MAX_TEXTS = int(os.getenv("TRANSLATE_BATCH_MAX_TEXTS", "100"))
+TRANSLATE_BATCH_MAX_TARGETS = int(os.getenv("TRANSLATE_BATCH_MAX_TARGETS", "10"))
+# Per-request limits of the Translate API; larger batches are split into several calls
+TRANSLATE_API_MAX_SEGMENTS = int(os.getenv("TRANSLATE_API_MAX_SEGMENTS", "128"))
+TRANSLATE_API_MAX_CHARS = int(os.getenv("TRANSLATE_API_MAX_CHARS", "30000"))
+
 # Models
 class TranslationRequest(BaseModel):
     text: str
@@ -49,6 +74,19 @@ class TranslationResponse(BaseModel):
     translated_text: str
     source_language: str
     target_language: str
+    # Only set when the text is one of the stored common phrases
+    pronunciation: Optional[str] = None
+    tts_url: Optional[str] = None
+
+class BatchTranslationRequest(BaseModel):
+    texts: List[str] = Field(min_length=1, max_length=TRANSLATE_BATCH_MAX_TEXTS)
+    source_language: str
+    target_languages: List[str] = Field(min_length=1, max_length=TRANSLATE_BATCH_MAX_TARGETS)
+
+class BatchTranslationResponse(BaseModel):
+    source_language: str
+    # Target language -> translations in the order of the request's texts
+    translations: Dict[str, List[str]]
 
 class TTSRequest(BaseModel):
     text: str
@@ -122,6 +160,47 @@ LANGUAGE_VOICES = {
     'de-DE': 'de-DE-Chirp3-HD-Charon'
 }
 
+# The Google clients are synchronous; their calls run on separate bounded thread pools
+TRANSLATE_WORKERS = int(os.getenv("TRANSLATE_WORKERS", "16"))
+TRANSLATE_MAX_QUEUE = int(os.getenv("TRANSLATE_MAX_QUEUE", "256"))
+TTS_WORKERS = int(os.getenv("TTS_WORKERS", "8"))
+TTS_MAX_QUEUE = int(os.getenv("TTS_MAX_QUEUE", "64"))
+translate_executor = BoundedExecutor(SERVICE_NAME, "translate", TRANSLATE_WORKERS, TRANSLATE_MAX_QUEUE)
+tts_executor = BoundedExecutor(SERVICE_NAME, "tts", TTS_WORKERS, TTS_MAX_QUEUE)
+
+# Concurrent single translations are held this long and sent together (0 disables)
+TRANSLATE_BATCH_WINDOW_MS = float(os.getenv("TRANSLATE_BATCH_WINDOW_MS", "5"))
+TRANSLATE_BATCH_MAX_SIZE = int(os.getenv("TRANSLATE_BATCH_MAX_SIZE", "64"))
+
+# Translations already fetched from Google, in memory and on disk
+translation_cache = TranslationCache()
+
+# Codes the Translate API and the stored phrases use instead of a language's base code
+LANGUAGE_CODE_ALIASES = {"cmn": "zh"}
+
+def base_language(language_code: str) -> str:
+    # The Translate API uses 'en', not 'en-US', etc.
+    base = language_code.split('-')[0]
+    return LANGUAGE_CODE_ALIASES.get(base, base)
+
+# Vetted translations of the common phrases (stored in English), served without Google
+PHRASE_SOURCE_LANGUAGE = "en"
+phrase_index = PhraseIndex()
+
+async def load_phrase_index() -> None:
+    try:
+        with track_dependency(SERVICE_NAME, "mongodb", "find"):
+            documents = await phrases_collection.find({}, {"phrase": 1, "translations": 1}).to_list(length=None)
+    except Exception as e:
+        print(f"Error loading common phrases index: {str(e)}")
+        return
+    phrase_index.load(
+        (document["phrase"], PHRASE_SOURCE_LANGUAGE, base_language(language_code), details)
+        for document in documents
+        for language_code, details in document.get("translations", {}).items()
+    )
+    print(f"Indexed {phrase_index.phrases} common phrases")
+
 # Initialize Google Cloud clients
 try:
     print(f"Initializing Google Cloud clients with key path: {SERVICE_ACCOUNT_KEY_PATH}")
@@ -133,26 +212,126 @@ except Exception as e:
     print(f"Error type: {type(e).__name__}")
     raise RuntimeError(f"Failed to initialize Google Cloud clients: {str(e)}")
 
+# Blocking Google calls, run on the executors
+def google_translate(values: Union[str, List[str]], source: str, target: str) -> Union[dict, List[dict]]:
+    # The client takes one string or a list of them (one result per item, in order)
+    with track_dependency(SERVICE_NAME, "google_translate", "translate") as span:
+        if span is not None:
+            texts = values if isinstance(values, list) else [values]
+            span.attributes.update(
+                target_language=target, segments=len(texts), text_chars=sum(len(text) for text in texts)
+            )
+        return translate_client.translate(
+            values, 
+            target_language=target,
+            source_language=source
+        )
+
+def google_synthesize_speech(input_text, voice, audio_config, language_code: str, text_chars: int):
+    with track_dependency(SERVICE_NAME, "google_tts", "synthesize_speech") as span:
+        if span is not None:
+            span.attributes.update(language_code=language_code, text_chars=text_chars)
+        return tts_client.synthesize_speech(
+            input=input_text, voice=voice, audio_config=audio_config
+        )
+
+# Single translations are micro-batched per language pair
+def google_translate_texts(texts: List[str], source: str, target: str) -> List[str]:
+    return [result["translatedText"] for result in google_translate(texts, source, target)]
+
+translate_batcher = MicroBatcher(
+    SERVICE_NAME, "translate", translate_executor, google_translate_texts,
+    window=TRANSLATE_BATCH_WINDOW_MS / 1000,
+    max_items=min(TRANSLATE_BATCH_MAX_SIZE, TRANSLATE_API_MAX_SEGMENTS),
+    max_chars=TRANSLATE_API_MAX_CHARS
+)
+
 # Translation function using Google Cloud Translate API
-def translate_text(text: str, source_language: str, target_language: str) -> str:
+async def translate_text(text: str, source_language: str, target_language: str) -> str:
     try:
         # Convert language codes if needed (API uses 'en', not 'en-US', etc.)
-        source = source_language.split('-')[0] if '-' in source_language else source_language
-        target = target_language.split('-')[0] if '-' in target_language else target_language
+        source = base_language(source_language)
+        target = base_language(target_language)
         
-        result = translate_client.translate(
-            text, 
-            target_language=target,
-            source_language=source
-        )
+        cached = await translation_cache.get(text, source, target)
+        if cached is not None:
+            return cached
         
-        return result["translatedText"]
+        # Sent together with other requests for this language pair arriving meanwhile
+        translated = await translate_batcher.submit((source, target), text)
+        
+        translation_cache.set(text, source, target, translated)
+        return translated
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in translation: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
 
+def translate_api_chunks(texts: List[str]) -> List[List[str]]:
+    """Split texts into consecutive groups that each fit in one Translate API request."""
+    chunks: List[List[str]] = []
+    chunk: List[str] = []
+    chars = 0
+    for text in texts:
+        if chunk and (len(chunk) >= TRANSLATE_API_MAX_SEGMENTS or chars + len(text) > TRANSLATE_API_MAX_CHARS):
+            chunks.append(chunk)
+            chunk, chars = [], 0
+        chunk.append(text)
+        chars += len(text)
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+# Many texts into many languages: cached translations are reused and the rest are sent
+# as lists, one call per target language (more only past the API's request limits)
+async def translate_batch(texts: List[str], source_language: str, target_languages: List[str]) -> Dict[str, List[str]]:
+    try:
+        source = base_language(source_language)
+        targets = {target_language: base_language(target_language) for target_language in target_languages}
+        
+        found: Dict[Tuple[str, str], str] = {}
+        lookups: List[Tuple[str, str]] = []
+        for target in dict.fromkeys(targets.values()):
+            for text in dict.fromkeys(texts):
+                phrase = phrase_index.lookup(text, source, target)
+                if phrase is not None:
+                    found[text, target] = phrase["translatedPhrase"]
+                else:
+                    lookups.append((text, target))
+        
+        cached = await translation_cache.get_many([(text, source, target) for text, target in lookups])
+        missing: Dict[str, List[str]] = {}
+        for (text, target), translated in zip(lookups, cached):
+            if translated is None:
+                missing.setdefault(target, []).append(text)
+            else:
+                found[text, target] = translated
+        
+        calls = [(target, chunk) for target, pending in missing.items() for chunk in translate_api_chunks(pending)]
+        results = await asyncio.gather(*(
+            translate_executor.run(google_translate, chunk, source, target) for target, chunk in calls
+        ))
+        for (target, chunk), result in zip(calls, results):
+            for text, translation in zip(chunk, result):
+                found[text, target] = translation["translatedText"]
+        # One disk transaction for the whole batch
+        translation_cache.set_many(
+            (text, source, target, found[text, target]) for target, chunk in calls for text in chunk
+        )
+        
+        return {
+            target_language: [found[text, target] for text in texts]
+            for target_language, target in targets.items()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"Error in batch translation: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
+
 # Real TTS function using Google Cloud TTS
-def text_to_speech(text: str, language_code: str, voice_name: Optional[str], 
+async def text_to_speech(text: str, language_code: str, voice_name: Optional[str], 
                    speaking_rate: float, pitch: float) -> tuple:
     try:
         # Use the proper voice mapping if available
@@ -171,17 +350,18 @@ def text_to_speech(text: str, language_code: str, voice_name: Optional[str],
             pitch=pitch
         )
         
-        response = tts_client.synthesize_speech(
-            input=input_text, voice=voice, audio_config=audio_config
+        response = await tts_executor.run(
+            google_synthesize_speech, input_text, voice, audio_config, language_code, len(text)
         )
         
         # Return the audio content and estimated duration directly without storing in GCS
-        audio_content_base64 = base64.b64encode(response.audio_content).decode('utf-8')
         # Estimate duration (Google doesn't provide this directly)
         estimated_duration = len(response.audio_content) / 16000  # Rough estimate
         
-        return audio_content_base64, estimated_duration, None
+        return response.audio_content, estimated_duration, None
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error in TTS processing: {str(e)}")
         raise HTTPException(status_code=500, detail=f"TTS processing failed: {str(e)}")
@@ -193,6 +373,10 @@ async def root():
         "version": "1.0.0",
         "endpoints": [
             "/translate/text",
+            "/translate/batch",
+            "/translate/cache",
+            "/translate/phrase-index",
+            "/executors",
             "/translate/tts",
             "/translate/languages",
             "/translate/voices/{language_code}",
@@ -213,28 +397,86 @@ async def get_voices_for_language(language_code: str):
     raise HTTPException(status_code=404, detail=f"No voices available for language code: {language_code}")
 
 @app.post("/translate/text", response_model=TranslationResponse)
-async def translate_text_endpoint(request: TranslationRequest):
+async def translate_text_endpoint(request: TranslationRequest, http_request: Request):
     # Validate language codes
     if request.source_language not in SUPPORTED_LANGUAGES:
         raise HTTPException(status_code=400, detail=f"Source language not supported: {request.source_language}")
     if request.target_language not in SUPPORTED_LANGUAGES:
         raise HTTPException(status_code=400, detail=f"Target language not supported: {request.target_language}")
     
+    # Stored common phrases come with their pronunciation and audio
+    phrase = phrase_index.lookup(
+        request.text, base_language(request.source_language), base_language(request.target_language)
+    )
+    if phrase is not None:
+        return wire.respond(http_request, TranslationResponse(
+            translated_text=phrase["translatedPhrase"],
+            source_language=request.source_language,
+            target_language=request.target_language,
+            pronunciation=phrase.get("pronunciation"),
+            tts_url=phrase.get("ttsUrl")
+        ), TranslationResponse)
+    
     # Call the translation function
-    translated_text = translate_text(
+    translated_text = await translate_text(
         request.text,
         request.source_language,
         request.target_language
     )
     
-    return TranslationResponse(
+    return wire.respond(http_request, TranslationResponse(
         translated_text=translated_text,
         source_language=request.source_language,
         target_language=request.target_language
+    ), TranslationResponse)
+
+@app.post("/translate/batch", response_model=BatchTranslationResponse)
+async def translate_batch_endpoint(request: BatchTranslationRequest, http_request: Request):
+    # Validate language codes
+    if request.source_language not in SUPPORTED_LANGUAGES:
+        raise HTTPException(status_code=400, detail=f"Source language not supported: {request.source_language}")
+    unsupported = [language for language in request.target_languages if language not in SUPPORTED_LANGUAGES]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"Target languages not supported: {', '.join(unsupported)}")
+    
+    translations = await translate_batch(request.texts, request.source_language, request.target_languages)
+    
+    return wire.respond(http_request, BatchTranslationResponse(
+        source_language=request.source_language,
+        translations=translations
+    ), BatchTranslationResponse)
+
+@app.get("/translate/cache")
+async def get_translation_cache_stats():
+    return await translation_cache.stats()
+
+@app.get("/translate/phrase-index")
+async def get_phrase_index_stats():
+    return phrase_index.stats()
+
+@app.get("/executors")
+async def get_executor_stats():
+    return {
+        "translate": translate_executor.stats(),
+        "tts": tts_executor.stats(),
+        "translate_batching": translate_batcher.stats()
+    }
+
+@app.delete("/translate/cache")
+async def invalidate_translation_cache(
+    text: Optional[str] = Query(None, description="Only remove translations of this text"),
+    source_language: Optional[str] = Query(None, description="Only remove translations from this language"),
+    target_language: Optional[str] = Query(None, description="Only remove translations into this language")
+):
+    purged = await translation_cache.invalidate(
+        text=text,
+        source=base_language(source_language) if source_language else None,
+        target=base_language(target_language) if target_language else None
     )
+    return {"purged": purged}
 
 @app.post("/translate/tts", response_model=TTSResponse)
-async def text_to_speech_endpoint(request: TTSRequest):
+async def text_to_speech_endpoint(request: TTSRequest, http_request: Request):
     # Validate language code
     if request.language_code not in SUPPORTED_LANGUAGES and request.language_code not in LANGUAGE_VOICES:
         raise HTTPException(status_code=400, detail=f"Language not supported: {request.language_code}")
@@ -245,7 +487,7 @@ async def text_to_speech_endpoint(request: TTSRequest):
         voice_name = LANGUAGE_VOICES[request.language_code]
     
     # Call the TTS function
-    audio_content_base64, duration_seconds, audio_url = text_to_speech(
+    audio_content, duration_seconds, audio_url = await text_to_speech(
         request.text,
         request.language_code,
         voice_name,
@@ -253,60 +495,74 @@ async def text_to_speech_endpoint(request: TTSRequest):
         request.pitch
     )
     
-    return TTSResponse(
-        audio_content_base64=audio_content_base64,
+    # MessagePack callers get the raw MP3 bytes instead of base64 text
+    if wire.accepts_msgpack(http_request.headers.get("accept")):
+        return wire.msgpack_response({
+            "audio_content": audio_content,
+            "duration_seconds": duration_seconds,
+            "audio_url": audio_url
+        })
+    
+    return fastjson.respond(TTSResponse(
+        audio_content_base64=base64.b64encode(audio_content).decode('utf-8'),
         duration_seconds=duration_seconds,
         audio_url=audio_url
-    )
+    ), TTSResponse)
 
 # New endpoints for common phrases
 
 @app.get("/common-phrases", response_model=List[CommonPhrase])
-async def get_common_phrases(limit: int = 50, skip: int = 0):
+async def get_common_phrases(http_request: Request, limit: int = 50, skip: int = 0):
     """
     Retrieve a list of common phrases with their translations.
     """
     phrases = []
     cursor = phrases_collection.find().skip(skip).limit(limit)
     
-    async for document in cursor:
+    with track_dependency(SERVICE_NAME, "mongodb", "find"):
+        documents = await cursor.to_list(length=limit)
+    for document in documents:
         phrases.append(CommonPhrase.model_validate(document))
     
-    return phrases
+    return wire.respond(http_request, phrases, List[CommonPhrase])
 
 @app.get("/common-phrases/categories")
 async def get_phrase_categories():
     """
     Get all available categories of common phrases.
     """
-    categories = await phrases_collection.distinct("category")
+    with track_dependency(SERVICE_NAME, "mongodb", "distinct"):
+        categories = await phrases_collection.distinct("category")
     return {"categories": categories}
 
 @app.get("/common-phrases/by-category/{category}", response_model=List[CommonPhrase])
-async def get_phrases_by_category(category: str):
+async def get_phrases_by_category(category: str, http_request: Request):
     """
     Get all phrases for a specific category.
     """
     phrases = []
     cursor = phrases_collection.find({"category": category})
     
-    async for document in cursor:
+    with track_dependency(SERVICE_NAME, "mongodb", "find"):
+        documents = await cursor.to_list(length=None)
+    for document in documents:
         phrases.append(CommonPhrase.model_validate(document))
     
     if not phrases:
         raise HTTPException(status_code=404, detail=f"No phrases found for category: {category}")
     
-    return phrases
+    return wire.respond(http_request, phrases, List[CommonPhrase])
 
 @app.get("/common-phrases/{phrase_id}", response_model=CommonPhrase)
-async def get_phrase_by_id(phrase_id: str):
+async def get_phrase_by_id(phrase_id: str, http_request: Request):
     """
     Get a specific phrase by its ID.
     """
     try:
-        document = await phrases_collection.find_one({"_id": ObjectId(phrase_id)})
+        with track_dependency(SERVICE_NAME, "mongodb", "find_one"):
+            document = await phrases_collection.find_one({"_id": ObjectId(phrase_id)})
         if document:
-            return CommonPhrase.model_validate(document)
+            return wire.respond(http_request, CommonPhrase.model_validate(document), CommonPhrase)
         raise HTTPException(status_code=404, detail=f"Phrase with ID {phrase_id} not found")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid phrase ID format: {str(e)}")
@@ -0,0 +1,72 @@
+"""In-memory index of the vetted common-phrase translations.
+
+The ``common_phrases`` collection already holds reviewed translations (with
+pronunciation and an audio URL) of the phrases travellers ask for most. The index is
+built from it at startup so ``/translate/text`` can answer those phrases without
+calling Google Translate.
+
+Lookups match the phrase after normalization: case, repeated whitespace and
+surrounding punctuation are ignored, so "thank you!" finds "Thank you".
+"""
+import re
+import string
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from prometheus_client import Counter
+
+PHRASE_INDEX_LOOKUPS = Counter(
+    "phrase_index_lookups_total",
+    "Common-phrase index lookups per result",
+    ["result"],
+)
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = string.punctuation + "¡¿。、！？"
+
+Key = Tuple[str, str, str]
+
+
+def normalize_phrase(text: str) -> str:
+    return _WHITESPACE.sub(" ", text).strip().strip(_PUNCTUATION).strip().casefold()
+
+
+class PhraseIndex:
+    def __init__(self) -> None:
+        self._entries: Dict[Key, Dict[str, Any]] = {}
+        self.phrases = 0
+        self.hits = 0
+        self.misses = 0
+
+    def load(self, entries: Iterable[Tuple[str, str, str, Dict[str, Any]]]) -> None:
+        """Replace the index with ``(phrase, source, target, details)`` entries.
+
+        Language codes must already be in the form lookups use (e.g. ``ja``, not ``ja-JP``).
+        """
+        index: Dict[Key, Dict[str, Any]] = {}
+        phrases = set()
+        for phrase, source, target, details in entries:
+            text = normalize_phrase(phrase)
+            if text and details.get("translatedPhrase"):
+                index[text, source, target] = details
+                phrases.add((text, source))
+        self._entries = index
+        self.phrases = len(phrases)
+
+    def lookup(self, text: str, source: str, target: str) -> Optional[Dict[str, Any]]:
+        """Stored ``translatedPhrase``/``pronunciation``/``ttsUrl`` of the phrase, or None."""
+        details = self._entries.get((normalize_phrase(text), source, target))
+        if details is None:
+            self.misses += 1
+            PHRASE_INDEX_LOOKUPS.labels("miss").inc()
+        else:
+            self.hits += 1
+            PHRASE_INDEX_LOOKUPS.labels("hit").inc()
+        return details
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "phrases": self.phrases,
+            "translations": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,190 @@
+"""Production entry point shared by the Travel Assistant services.
+
+Each service is built from its own directory, so this module is kept as an identical
+copy in every service folder. Run it from the service folder instead of ``uvicorn``:
+
+    WEB_CONCURRENCY=4 python serve.py
+
+- ``WEB_CONCURRENCY`` worker processes (default 1, ``0`` means one per CPU core) run
+  ``APP_MODULE`` (default ``main:app``) on ``HOST``:``SERVICE_PORT``.
+- uvloop and httptools are used when installed.
+- With several workers each one binds its own listening socket with ``SO_REUSEPORT``,
+  so the kernel spreads new connections evenly across them. Workers are started with
+  the ``spawn`` method and import the app themselves; nothing opened by this process
+  (clients, thread pools, caches) is inherited. A worker that dies is replaced, after
+  an exponential backoff if it died within ``WORKER_STARTUP_WINDOW`` seconds of
+  starting; after ``WORKER_MAX_START_FAILURES`` such failures in a row (e.g. the app
+  cannot import) the supervisor stops and exits non-zero, as a single worker would.
+- Prometheus metrics of all workers are aggregated through the client's multiprocess
+  mode in ``PROMETHEUS_MULTIPROC_DIR`` (a fresh temporary directory if unset), so
+  ``/metrics`` on any worker reports the whole service.
+"""
+import importlib.util
+import logging
+import multiprocessing
+import os
+import re
+import signal
+import socket
+import sys
+import tempfile
+import time
+
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("SERVICE_PORT", "8000"))
+APP_MODULE = os.getenv("APP_MODULE", "main:app")
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+GRACEFUL_TIMEOUT = float(os.getenv("GRACEFUL_TIMEOUT", "30"))
+WORKER_STARTUP_WINDOW = float(os.getenv("WORKER_STARTUP_WINDOW", "10"))
+WORKER_MAX_START_FAILURES = int(os.getenv("WORKER_MAX_START_FAILURES", "5"))
+RESTART_BACKOFF_MAX = 30.0
+LOOP = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+HTTP = "httptools" if importlib.util.find_spec("httptools") else "h11"
+
+logger = logging.getLogger("uvicorn.error")
+
+# Sample files prometheus_client writes in multiprocess mode, e.g. "gauge_livesum_12.db"
+METRICS_FILE = re.compile(r"^(counter|histogram|summary|gauge_[a-z]+)_\d+\.db$")
+
+
+def worker_count() -> int:
+    return WEB_CONCURRENCY if WEB_CONCURRENCY > 0 else os.cpu_count() or 1
+
+
+def server_config(**kwargs) -> uvicorn.Config:
+    return uvicorn.Config(APP_MODULE, host=HOST, port=PORT, loop=LOOP, http=HTTP, **kwargs)
+
+
+def prepare_metrics_dir() -> str:
+    """Point every worker at a multiprocess metrics directory without stale samples.
+
+    Only prometheus_client's own sample files are removed. A directory that holds
+    anything else is refused instead of emptied, since it is not dedicated to metrics.
+    """
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        path = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="prometheus-")
+    os.makedirs(path, exist_ok=True)
+    names = os.listdir(path)
+    foreign = [name for name in names if not METRICS_FILE.match(name)]
+    if foreign:
+        raise SystemExit(
+            f"PROMETHEUS_MULTIPROC_DIR={path} contains files that are not metrics samples "
+            f"({', '.join(sorted(foreign)[:5])}); point it at a dedicated directory"
+        )
+    # Files left over from a previous run would be added to this run's totals
+    for name in names:
+        os.remove(os.path.join(path, name))
+    return path
+
+
+def reuse_port_socket() -> socket.socket:
+    family = socket.AF_INET6 if ":" in HOST else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((HOST, PORT))
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker() -> None:
+    server = uvicorn.Server(server_config())
+    server.run(sockets=[reuse_port_socket()])
+
+
+def supervise(workers: int) -> int:
+    """Run and replace the workers until a signal arrives; returns the exit status."""
+    context = multiprocessing.get_context("spawn")
+    from prometheus_client import multiprocess
+
+    def start_worker() -> multiprocessing.Process:
+        process = context.Process(target=run_worker, name="uvicorn-worker")
+        process.start()
+        logger.info("Started worker process [%d]", process.pid)
+        return process
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    processes = [start_worker() for _ in range(workers)]
+    started = [time.monotonic()] * workers
+    # Slots whose worker died and is waiting out its backoff: index -> restart time
+    restart_at = {}
+    start_failures = 0
+    status = 0
+    while not stopping:
+        time.sleep(0.5)
+        now = time.monotonic()
+        for index, process in enumerate(processes):
+            if stopping:
+                break
+            if process is None:
+                if now >= restart_at[index]:
+                    del restart_at[index]
+                    processes[index], started[index] = start_worker(), now
+                continue
+            if process.is_alive():
+                continue
+            multiprocess.mark_process_dead(process.pid)
+            processes[index] = None
+            if now - started[index] >= WORKER_STARTUP_WINDOW:
+                start_failures = 0
+                restart_at[index] = now
+                logger.warning("Worker process [%d] exited with %s; restarting", process.pid, process.exitcode)
+                continue
+            # Died while starting up: most likely every worker will, so back off and give up
+            start_failures += 1
+            if start_failures >= WORKER_MAX_START_FAILURES:
+                logger.error(
+                    "Worker process [%d] exited with %s during startup; %d startup failures in a row, "
+                    "shutting down", process.pid, process.exitcode, start_failures,
+                )
+                stopping, status = True, 1
+                break
+            delay = min(0.5 * 2 ** start_failures, RESTART_BACKOFF_MAX)
+            restart_at[index] = now + delay
+            logger.warning(
+                "Worker process [%d] exited with %s during startup; restarting in %.1fs",
+                process.pid, process.exitcode, delay,
+            )
+
+    processes = [process for process in processes if process is not None]
+    for process in processes:
+        process.terminate()
+    deadline = time.monotonic() + GRACEFUL_TIMEOUT
+    for process in processes:
+        process.join(max(0.0, deadline - time.monotonic()))
+        if process.is_alive():
+            process.kill()
+            process.join()
+        multiprocess.mark_process_dead(process.pid)
+    return status
+
+
+def main() -> None:
+    workers = worker_count()
+    if workers == 1:
+        uvicorn.Server(server_config()).run()
+        return
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    prepare_metrics_dir()
+    if hasattr(socket, "SO_REUSEPORT"):
+        logger.info("Starting %d workers on %s:%d with SO_REUSEPORT", workers, HOST, PORT)
+        sys.exit(supervise(workers))
+    else:
+        # No SO_REUSEPORT on this platform: uvicorn shares one listening socket instead
+        uvicorn.run(APP_MODULE, host=HOST, port=PORT, loop=LOOP, http=HTTP, workers=workers)
+
+
+if __name__ == "__main__":
+    main()
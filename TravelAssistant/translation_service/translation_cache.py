@@ -0,0 +1,258 @@
+"""Two-tier cache of Google Translate results for the translation service.
+
+Travellers send the same short strings in the same language pairs over and over, so
+translations are cached by normalized ``(text, source, target)``:
+
+- an in-process LRU (``TRANSLATION_CACHE_SIZE`` entries) answers repeats without I/O;
+  its entries live at most ``TRANSLATION_CACHE_MEMORY_TTL`` seconds so invalidations
+  made through another worker process are picked up,
+- a SQLite file (``TRANSLATION_CACHE_DB``) keeps up to ``TRANSLATION_CACHE_DB_MAX_ENTRIES``
+  translations across restarts and is shared by all worker processes.
+
+Entries expire ``TRANSLATION_CACHE_TTL`` seconds after they were stored.
+
+The memory tier is used directly from the event loop. Every SQLite query runs on one
+worker thread instead, so a slow disk or a database locked by another worker process
+never stalls the loop. Writes are queued there without waiting for them.
+"""
+import asyncio
+import os
+import re
+import sqlite3
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from prometheus_client import Counter
+
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "10000"))
+TRANSLATION_CACHE_TTL = float(os.getenv("TRANSLATION_CACHE_TTL", str(30 * 24 * 3600)))
+TRANSLATION_CACHE_MEMORY_TTL = float(os.getenv("TRANSLATION_CACHE_MEMORY_TTL", "300"))
+# Empty disables the on-disk tier
+TRANSLATION_CACHE_DB = os.getenv("TRANSLATION_CACHE_DB", "translation_cache.sqlite3")
+TRANSLATION_CACHE_DB_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_DB_MAX_ENTRIES", "200000"))
+# Expired and excess rows are pruned after this many writes
+PRUNE_EVERY = 1000
+
+CACHE_LOOKUPS = Counter(
+    "translation_cache_lookups_total",
+    "Translation cache lookups per tier and result",
+    ["tier", "result"],
+)
+
+_WHITESPACE = re.compile(r"\s+")
+
+Key = Tuple[str, str, str]
+
+
+def cache_key(text: str, source: str, target: str) -> Key:
+    """Normalize surrounding and repeated whitespace and language code case.
+
+    Letter case and punctuation are kept: they change the translation.
+    """
+    return _WHITESPACE.sub(" ", text).strip(), source.lower(), target.lower()
+
+
+class TranslationCache:
+    def __init__(
+        self,
+        maxsize: int = TRANSLATION_CACHE_SIZE,
+        ttl: float = TRANSLATION_CACHE_TTL,
+        memory_ttl: float = TRANSLATION_CACHE_MEMORY_TTL,
+        db_path: str = TRANSLATION_CACHE_DB,
+        max_db_entries: int = TRANSLATION_CACHE_DB_MAX_ENTRIES,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.memory_ttl = min(memory_ttl, ttl)
+        self.db_path = db_path
+        self.max_db_entries = max_db_entries
+        self._memory: "OrderedDict[Key, Tuple[float, str]]" = OrderedDict()
+        self._db: Optional[sqlite3.Connection] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pid: Optional[int] = None
+        self._writes = 0
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self.disk_errors = 0
+
+    # Threads and SQLite connections must not cross fork(); each process starts its own lazily
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None or self._pid != os.getpid():
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="translation-cache")
+            self._db = None
+            self._pid = os.getpid()
+        return self._pool
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor(), fn, *args)
+
+    # Only called on the cache's worker thread
+    def _connection(self) -> sqlite3.Connection:
+        if self._db is None:
+            db = sqlite3.connect(self.db_path, timeout=5, isolation_level=None, check_same_thread=False)
+            # WAL lets worker processes read while one writes; NORMAL skips the fsync per commit
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                " text TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL,"
+                " translated TEXT NOT NULL, expires_at REAL NOT NULL,"
+                " PRIMARY KEY (text, source, target))"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS translations_expires_at ON translations (expires_at)")
+            self._db = db
+        return self._db
+
+    async def get(self, text: str, source: str, target: str) -> Optional[str]:
+        return (await self.get_many([(text, source, target)]))[0]
+
+    async def get_many(self, requests: List[Tuple[str, str, str]]) -> List[Optional[str]]:
+        """Look up several ``(text, source, target)`` at once; one disk round trip for all memory misses."""
+        keys = [cache_key(*request) for request in requests]
+        now = time.time()
+        results = [self._recall(key, now) for key in keys]
+        missing = [index for index, result in enumerate(results) if result is None]
+
+        if missing and self.db_path:
+            try:
+                rows = await self._run(self._select, [keys[index] for index in missing], now)
+            except sqlite3.Error as e:
+                # The disk tier is an optimization; failing to read it is a miss
+                print(f"Error reading translation cache: {str(e)}")
+                self.disk_errors += 1
+                rows = [None] * len(missing)
+            for index, row in zip(missing, rows):
+                if row is not None:
+                    self.hits["disk"] += 1
+                    CACHE_LOOKUPS.labels("disk", "hit").inc()
+                    self._remember(keys[index], row[0], min(row[1], now + self.memory_ttl))
+                    results[index] = row[0]
+                else:
+                    CACHE_LOOKUPS.labels("disk", "miss").inc()
+        self.misses += sum(1 for result in results if result is None)
+        return results
+
+    def _recall(self, key: Key, now: float) -> Optional[str]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            if entry[0] > now:
+                self._memory.move_to_end(key)
+                self.hits["memory"] += 1
+                CACHE_LOOKUPS.labels("memory", "hit").inc()
+                return entry[1]
+            del self._memory[key]
+        CACHE_LOOKUPS.labels("memory", "miss").inc()
+        return None
+
+    def _select(self, keys: List[Key], now: float) -> List[Optional[Tuple[str, float]]]:
+        db = self._connection()
+        rows = []
+        for key in keys:
+            row = db.execute(
+                "SELECT translated, expires_at FROM translations WHERE text = ? AND source = ? AND target = ?",
+                key,
+            ).fetchone()
+            rows.append(row if row is not None and row[1] > now else None)
+        return rows
+
+    def set(self, text: str, source: str, target: str, translated: str) -> None:
+        self.set_many([(text, source, target, translated)])
+
+    def set_many(self, entries: Iterable[Tuple[str, str, str, str]]) -> None:
+        """Store translations in memory now and queue them for disk in one transaction."""
+        now = time.time()
+        rows = []
+        for text, source, target, translated in entries:
+            key = cache_key(text, source, target)
+            self._remember(key, translated, now + self.memory_ttl)
+            rows.append((*key, translated, now + self.ttl))
+        if rows and self.db_path:
+            self._executor().submit(self._insert, rows).add_done_callback(self._log_write_error)
+
+    def _insert(self, rows: List[Tuple[str, str, str, str, float]]) -> None:
+        db = self._connection()
+        db.execute("BEGIN")
+        try:
+            db.executemany(
+                "INSERT OR REPLACE INTO translations (text, source, target, translated, expires_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                rows,
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        previous, self._writes = self._writes, self._writes + len(rows)
+        if previous // PRUNE_EVERY != self._writes // PRUNE_EVERY:
+            self._prune()
+
+    def _log_write_error(self, future: "Future[None]") -> None:
+        error = future.exception()
+        if error is not None:
+            print(f"Error writing translation cache: {str(error)}")
+            self.disk_errors += 1
+
+    def _remember(self, key: Key, translated: str, expires_at: float) -> None:
+        if self.maxsize <= 0:
+            return
+        self._memory[key] = (expires_at, translated)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)
+
+    def _prune(self) -> None:
+        """Drop expired rows, then the rows closest to expiry beyond the size cap."""
+        db = self._connection()
+        db.execute("DELETE FROM translations WHERE expires_at <= ?", (time.time(),))
+        excess = db.execute("SELECT COUNT(*) FROM translations").fetchone()[0] - self.max_db_entries
+        if excess > 0:
+            db.execute(
+                "DELETE FROM translations WHERE rowid IN"
+                " (SELECT rowid FROM translations ORDER BY expires_at LIMIT ?)",
+                (excess,),
+            )
+
+    async def invalidate(
+        self,
+        text: Optional[str] = None,
+        source: Optional[str] = None,
+        target: Optional[str] = None,
+    ) -> int:
+        """Remove matching entries from both tiers (everything without filters); return the count removed."""
+        given = (text, source, target)
+        wanted = cache_key(text or "", source or "", target or "")
+        positions = [index for index, value in enumerate(given) if value is not None]
+
+        removed = [key for key in self._memory if all(key[index] == wanted[index] for index in positions)]
+        for key in removed:
+            del self._memory[key]
+
+        if not self.db_path:
+            return len(removed)
+        columns = ("text", "source", "target")
+        where = " AND ".join(f"{columns[index]} = ?" for index in positions) or "1"
+        # Queued after any pending writes on the same thread, so those are removed too
+        deleted = await self._run(self._delete, where, [wanted[index] for index in positions])
+        return max(deleted, len(removed))
+
+    def _delete(self, where: str, values: List[str]) -> int:
+        return self._connection().execute(f"DELETE FROM translations WHERE {where}", values).rowcount
+
+    def _count(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+
+    async def stats(self) -> Dict[str, Any]:
+        lookups = self.hits["memory"] + self.hits["disk"] + self.misses
+        return {
+            "memory_size": len(self._memory),
+            "memory_maxsize": self.maxsize,
+            "disk_size": await self._run(self._count) if self.db_path else None,
+            "disk_max_entries": self.max_db_entries if self.db_path else None,
+            "memory_hits": self.hits["memory"],
+            "disk_hits": self.hits["disk"],
+            "misses": self.misses,
+            "disk_errors": self.disk_errors,
+            "hit_rate": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
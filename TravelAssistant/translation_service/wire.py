@@ -0,0 +1,76 @@
+"""Optional MessagePack wire format for the internal gateway -> service hop.
+
+Each service is built from its own directory, so this module is kept as an identical
+copy in every service folder. A caller that sends ``Accept: application/x-msgpack``
+gets MessagePack from the routes answering through ``respond``; everything else (other
+callers, error responses, routes without a model) stays JSON, so the ``Content-Type``
+of each response says how to decode it.
+
+Binary payloads travel as raw MessagePack bytes instead of base64 text: a field
+``audio_content`` holding bytes stands for the JSON field ``audio_content_base64``,
+and ``to_json_compatible`` converts back for JSON clients.
+"""
+import base64
+import json
+from typing import Any, Optional
+
+from starlette.responses import Response
+
+import fastjson
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+MSGPACK_MEDIA_TYPE = "application/x-msgpack"
+# Accept header for callers that prefer MessagePack but understand JSON
+ACCEPT_MSGPACK = f"{MSGPACK_MEDIA_TYPE}, application/json;q=0.9"
+BYTES_FIELD_SUFFIX = "_base64"
+
+
+def accepts_msgpack(accept: Optional[str]) -> bool:
+    return msgpack is not None and bool(accept) and MSGPACK_MEDIA_TYPE in accept
+
+
+def is_msgpack(content_type: Optional[str]) -> bool:
+    return (content_type or "").split(";")[0].strip() == MSGPACK_MEDIA_TYPE
+
+
+def msgpack_response(value: Any, status_code: int = 200) -> Response:
+    return Response(msgpack.packb(value, use_bin_type=True), status_code=status_code, media_type=MSGPACK_MEDIA_TYPE)
+
+
+def respond(request, value: Any, annotation: Any, status_code: int = 200) -> Any:
+    """Answer with MessagePack if the caller asked for it, otherwise as ``fastjson.respond``."""
+    if accepts_msgpack(request.headers.get("accept")):
+        return msgpack_response(fastjson.type_adapter(annotation).dump_python(value, by_alias=True), status_code)
+    return fastjson.respond(value, annotation, status_code)
+
+
+def to_json_compatible(value: Any) -> Any:
+    """Turn every bytes field ``name`` into a base64 string field ``name_base64``, recursively."""
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if isinstance(item, bytes):
+                result[f"{key}{BYTES_FIELD_SUFFIX}"] = base64.b64encode(item).decode("ascii")
+            else:
+                result[key] = to_json_compatible(item)
+        return result
+    if isinstance(value, list):
+        return [to_json_compatible(item) for item in value]
+    return value
+
+
+def decode(content: bytes, content_type: Optional[str]) -> Any:
+    """Parse a JSON or MessagePack body into JSON-compatible Python data."""
+    if is_msgpack(content_type):
+        return to_json_compatible(msgpack.unpackb(content, raw=False))
+    return json.loads(content)
+
+
+def transcode_to_json(content: bytes) -> bytes:
+    """Re-encode a MessagePack body as JSON, formatted like FastAPI's JSONResponse."""
+    value = to_json_compatible(msgpack.unpackb(content, raw=False))
+    return json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")